@@ -0,0 +1,68 @@
+"""
+Compare the vectorised income derivations with the row-wise versions they replaced.
+
+    python -m benchmarks.derivations [rows ...]
+"""
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+import derivations
+from utils import calculate_financial_year
+
+
+def synthetic_income(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    gross_income = rng.uniform(100, 5000, rows)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 4000, rows), unit="D"),
+        "Gross Income": gross_income,
+        "Salary Sacrifice": np.where(rng.random(rows) < 0.5, 100.0, 0.0),
+        "Tax": gross_income * 0.3,
+        "Taxable": rng.integers(0, 3, rows),
+    })
+
+
+def row_wise_taxable_income(income_data):
+    return income_data.apply(
+        lambda row: (
+            row['Gross Income'] - row['Salary Sacrifice']
+            if row['Taxable'] == 1 else
+            row['Gross Income'] + row['Tax'])
+        if row['Taxable'] == 2
+        else 0,
+        axis=1
+    )
+
+
+CASES = {
+    "Financial Year": (
+        lambda df: df["Date"].apply(calculate_financial_year),
+        lambda df: derivations.financial_year(df["Date"]),
+    ),
+    "Taxable Income": (
+        row_wise_taxable_income,
+        derivations.taxable_income,
+    ),
+    "Period (Month)": (
+        lambda df: df["Date"].dt.to_period("M").apply(lambda r: r.start_time),
+        lambda df: derivations.period_start(df["Date"], "M"),
+    ),
+}
+
+
+def run(rows):
+    income_data = synthetic_income(rows)
+    for name, (row_wise, vectorised) in CASES.items():
+        pd.testing.assert_series_equal(
+            row_wise(income_data), vectorised(income_data), check_dtype=False, check_names=False)
+        row_wise_seconds = min(timeit.repeat(lambda: row_wise(income_data), number=1, repeat=3))
+        vectorised_seconds = min(timeit.repeat(lambda: vectorised(income_data), number=1, repeat=3))
+        print(
+            f"{rows:>9,} rows  {name:<16} row-wise {row_wise_seconds:8.3f}s  "
+            f"vectorised {vectorised_seconds:8.4f}s  x{row_wise_seconds / vectorised_seconds:,.0f}")
+
+
+if __name__ == "__main__":
+    for rows in [int(arg) for arg in sys.argv[1:]] or [100_000]:
+        run(rows)
@@ -0,0 +1,100 @@
+"""Run the pages' render functions without a Streamlit server."""
+import ast
+import pandas as pd
+
+
+class HeadlessDeltaGenerator:
+    """
+    Stands in for the DeltaGenerator the render functions draw on.
+
+    Widgets return their defaults (multiselects nothing, so nothing is filtered out) and
+    everything drawn is serialised the way Streamlit would before sending it to the browser,
+    so the cost of building charts and tables is part of the timing.
+    """
+
+    def __init__(self):
+        self.elements = 0
+
+    @property
+    def sidebar(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def columns(self, spec, **kwargs):
+        return [self] * (spec if isinstance(spec, int) else len(spec))
+
+    def tabs(self, labels):
+        return [self] * len(labels)
+
+    def date_input(self, label, value=None, **kwargs):
+        return value
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return list(default or [])
+
+    def selectbox(self, label, options, index=0, **kwargs):
+        options = list(options)
+        return options[index] if index is not None and options else None
+
+    def radio(self, label, options, index=0, **kwargs):
+        return self.selectbox(label, options, index)
+
+    def button(self, *args, **kwargs):
+        return False
+
+    def checkbox(self, label, value=False, **kwargs):
+        return value
+
+    def slider(self, label, min_value=None, max_value=None, value=None, **kwargs):
+        return min_value if value is None else value
+
+    def number_input(self, label, min_value=None, max_value=None, value="min", **kwargs):
+        return min_value if value == "min" else value
+
+    def data_editor(self, data, **kwargs):
+        self.elements += 1
+        return data
+
+    def _serialise(self, content):
+        if type(content).__name__ == "Styler":
+            content.to_html()
+        elif isinstance(content, pd.DataFrame):
+            import pyarrow
+
+            pyarrow.Table.from_pandas(content)
+        elif hasattr(content, "to_plotly_json"):
+            content.to_json()
+        elif hasattr(content, "to_dict") and hasattr(content, "mark_bar"):
+            content.to_dict()
+
+    def __getattr__(self, name):
+        # write, metric, altair_chart, plotly_chart, map, dataframe, table, subheader, ...
+        def element(*args, **kwargs):
+            self.elements += 1
+            for content in list(args) + list(kwargs.values()):
+                self._serialise(content)
+            return self
+        return element
+
+
+def load_page(path):
+    """
+    The functions a page defines, without running the page.
+
+    Pages render at import (Streamlit runs them as scripts), so only their imports and
+    definitions are executed.
+    """
+    with open(path) as page:
+        module = ast.parse(page.read(), path)
+    module.body = [
+        node for node in module.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+    ]
+    namespace = {"__name__": "benchmarks.page", "__file__": path}
+    exec(compile(module, path, "exec"), namespace)
+    return namespace
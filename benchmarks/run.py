@@ -0,0 +1,195 @@
+"""
+Headless benchmarks of the data loaders and page renders.
+
+    python -m benchmarks.run --rows 10000 100000 1000000
+
+Synthetic workbooks are generated once per size under --data-dir, transactions are served
+by a local stand-in for the Up bank client. Each run is appended to --results and compared
+with the previous run at the same size.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from datetime import datetime
+import pandas as pd
+import streamlit.logger
+from benchmarks import synthetic
+from benchmarks.headless import HeadlessDeltaGenerator, load_page
+from benchmarks.transactions_server import TransactionsServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+ACCOUNT_IDS = ["a90b55ad-1bcb-4e75-b407-0e0e1e5c8a6d", "0c0ffee0-5a7e-4b1d-9c3a-000000000002"]
+
+
+def prepare_data(data_dir, rows):
+    size_dir = os.path.join(data_dir, str(rows))
+    os.makedirs(size_dir, exist_ok=True)
+    paths = {
+        "spending": os.path.join(size_dir, "spending.xlsx"),
+        "income": os.path.join(size_dir, "income.xlsx"),
+        "store": os.path.join(size_dir, "transactions.db"),
+    }
+    if not os.path.exists(paths["spending"]):
+        print(f"Generating {rows} row spending workbook...")
+        synthetic.write_workbook(paths["spending"], synthetic.spending_sheets(rows))
+    if not os.path.exists(paths["income"]):
+        print(f"Generating {rows} row income workbook...")
+        synthetic.write_workbook(paths["income"], synthetic.income_sheets(rows))
+    return paths
+
+
+def measure(run, setup=None, repeat=3):
+    """Best of `repeat` timings of `run`, with `setup` run untimed before each."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def benchmarks(paths):
+    """(name, run, setup) for every benchmark, in the order they are run."""
+    import streamlit as st
+    import utils
+    import workbook_cache
+    import workbook_reader
+
+    pages = {
+        name: load_page(os.path.join(ROOT, "pages", f"{name}.py"))
+        for name in ["1_recent_spending", "2_detailed_spending", "3_income"]
+    }
+
+    def clear_memory():
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+    def clear_disk(path):
+        def clear():
+            shutil.rmtree(workbook_cache.cache_dir(path), ignore_errors=True)
+            clear_memory()
+        return clear
+
+    def clear_store():
+        if os.path.exists(paths["store"]):
+            os.remove(paths["store"])
+        clear_memory()
+
+    def render_recent_spending():
+        one_month_ago = pd.Timestamp.now() - pd.DateOffset(months=1)
+        pages["1_recent_spending"]["render_recent_spending"](
+            HeadlessDeltaGenerator(),
+            utils.fetch_spending_rollup(start_date=one_month_ago.normalize())
+            .loc[lambda df: df.Date > one_month_ago])
+
+    def render_detailed_spending():
+        pages["2_detailed_spending"]["render_detailed_spending"](HeadlessDeltaGenerator())
+
+    def render_income():
+        _, deductions_data = utils.fetch_income_deduction_data()
+        pages["3_income"]["render_income"](HeadlessDeltaGenerator(), utils.income_filter_index(), deductions_data)
+
+    loaders = [
+        ("fetch_spending_data", utils.fetch_spending_data, paths["spending"]),
+        ("fetch_income_deduction_data", utils.fetch_income_deduction_data, paths["income"]),
+    ]
+    for name, loader, path in loaders:
+        # cold: workbook parsed, parquet: read from the on-disk cache, warm: memoised
+        yield f"{name} cold", loader, clear_disk(path)
+        yield f"{name} parquet", loader, clear_memory
+        yield f"{name} warm", loader, None
+    # The workbook parse alone, with each engine installed
+    engines = ["openpyxl"] + (["calamine"] if workbook_reader.python_calamine is not None else [])
+    for engine in engines:
+        yield (
+            f"read_sheets spending {engine}",
+            lambda engine=engine: workbook_reader.read_sheets(paths["spending"], utils.SPENDING_SHEET_COLUMNS, engine),
+            None)
+    yield "fetch_transaction_data cold", utils.fetch_transaction_data, clear_store
+    yield "fetch_transaction_data store", utils.fetch_transaction_data, clear_memory
+    yield "fetch_transaction_data warm", utils.fetch_transaction_data, None
+    for name, render in [
+        ("render_recent_spending", render_recent_spending),
+        ("render_detailed_spending", render_detailed_spending),
+        ("render_income", render_income),
+    ]:
+        yield f"{name} cold", render, clear_memory
+        yield f"{name} warm", render, None
+
+
+def previous_results(results_path, rows):
+    previous = {}
+    if not os.path.exists(results_path):
+        return previous
+    with open(results_path) as results:
+        for line in results:
+            result = json.loads(line)
+            if result["rows"] == rows:
+                previous[result["benchmark"]] = result
+    return previous
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows, data_dir, results_path, repeat):
+    import utils
+
+    paths = prepare_data(data_dir, rows)
+    os.environ["EXCEL_PATH_SPENDING"] = paths["spending"]
+    os.environ["EXCEL_PATH_INCOME"] = paths["income"]
+    os.environ["TRANSACTION_STORE_PATH"] = paths["store"]
+    os.environ["UP_ACCOUNT_IDS"] = ",".join(ACCOUNT_IDS)
+    previous = previous_results(results_path, rows)
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    commit = current_commit()
+
+    with TransactionsServer(synthetic.transactions(rows, ACCOUNT_IDS)) as server:
+        utils.TRANSACTIONS_URI = server.uri
+        print(f"\n{rows} rows")
+        with open(results_path, "a") as results:
+            for name, benchmark, setup in benchmarks(paths):
+                seconds = measure(benchmark, setup, repeat)
+                change = ""
+                if name in previous and previous[name]["seconds"]:
+                    change = f"{seconds / previous[name]['seconds'] - 1:+.0%} vs {previous[name]['commit']}"
+                print(f"  {name:<40} {seconds * 1000:>10.1f} ms  {change}")
+                results.write(json.dumps({
+                    "timestamp": timestamp,
+                    "commit": commit,
+                    "rows": rows,
+                    "benchmark": name,
+                    "seconds": seconds,
+                }) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "benchmarks", "data"))
+    parser.add_argument("--results", default=os.path.join(ROOT, "benchmarks", "results.jsonl"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Streamlit warns on every cached call made outside `streamlit run`
+    streamlit.logger.set_log_level(logging.ERROR)
+    for rows in args.rows:
+        run(rows, args.data_dir, args.results, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
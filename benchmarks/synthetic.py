@@ -0,0 +1,136 @@
+"""Synthetic spending/income workbooks and Up bank transactions with realistic cardinalities."""
+import numpy as np
+import pandas as pd
+
+
+CATEGORIES = ["Wants", "Week by Week", "Bills"]
+SUB_CATEGORIES = 15
+SUB_SUB_CATEGORIES = 60
+ITEMS = 400
+SHOPS = 150
+TAGS = 30
+LOCATIONS = 200
+ITEMS_PER_RECEIPT = 4
+LINE_ITEMS_PER_DAY = 25
+
+
+def _zipf_choice(rng, options, size):
+    # A few shops/items account for most purchases, like real spending
+    weights = 1 / np.arange(1, len(options) + 1)
+    return rng.choice(np.asarray(options, dtype=object), size=size, p=weights / weights.sum())
+
+
+def spending_sheets(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    sub_categories = ["Miscellaneous"] + [f"Sub Category {i}" for i in range(1, SUB_CATEGORIES)]
+    sub_sub_categories = [f"Sub Sub Category {i}" for i in range(SUB_SUB_CATEGORIES)]
+    items = [f"Item {i}" for i in range(ITEMS)]
+    locations = [f"Location {i}" for i in range(LOCATIONS)]
+
+    top_table = pd.DataFrame({
+        "Sub Category": sub_categories,
+        "Category": [CATEGORIES[i % len(CATEGORIES)] for i in range(SUB_CATEGORIES)],
+    })
+    middle_table = pd.DataFrame({
+        "Sub Sub Category": sub_sub_categories,
+        "Sub Category": [sub_categories[i % SUB_CATEGORIES] for i in range(SUB_SUB_CATEGORIES)],
+    })
+    base_table = pd.DataFrame({
+        "All Items": items,
+        "Sub Sub Category": [sub_sub_categories[i % SUB_SUB_CATEGORIES] for i in range(ITEMS)],
+    })
+    location = pd.DataFrame({
+        "Location": locations,
+        "Latitude": -33.87 + rng.normal(0, 0.05, LOCATIONS),
+        "Longitude": 151.21 + rng.normal(0, 0.05, LOCATIONS),
+    })
+
+    receipts = max(rows // ITEMS_PER_RECEIPT, 1)
+    receipt_ref = np.sort(rng.integers(0, receipts, rows))
+    days = max(rows // LINE_ITEMS_PER_DAY, 1)
+    receipt_dates = pd.Timestamp.today().normalize() - pd.to_timedelta(
+        np.sort(rng.integers(0, days, receipts))[::-1], unit="D")
+    receipt_shops = _zipf_choice(rng, [f"Shop {i}" for i in range(SHOPS)], receipts)
+    receipt_locations = _zipf_choice(rng, locations, receipts)
+    spending = pd.DataFrame({
+        "Item": _zipf_choice(rng, items, rows),
+        "Cost": rng.gamma(2, 8, rows).round(2),
+        "Quantity": rng.integers(1, 4, rows),
+        "Measure": rng.choice(np.array(["unit", "kg", None], dtype=object), rows),
+        "Location": receipt_locations[receipt_ref],
+        "Shop": receipt_shops[receipt_ref],
+        "Details": rng.choice(np.array(["", "on special", "gift", None], dtype=object), rows),
+        "Tag": _zipf_choice(rng, [f"Tag {i}" for i in range(TAGS)], rows),
+        "Date": receipt_dates[receipt_ref],
+        "Receipt Ref": receipt_ref,
+        "Receipt": None,
+        "transactionId": [f"txn-{ref:08d}" for ref in receipt_ref],
+    })
+    return {
+        "Spending": spending,
+        "Top_Table": top_table,
+        "Middle Table": middle_table,
+        "Base Table": base_table,
+        "Location": location,
+    }
+
+
+def income_sheets(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp.today().normalize() - pd.to_timedelta(np.sort(rng.integers(0, 3650, rows))[::-1], unit="D")
+    gross_income = rng.gamma(4, 800, rows).round(2)
+    tax = np.where(rng.random(rows) < 0.9, (gross_income * 0.3).round(2), np.nan)
+    income = pd.DataFrame({
+        "Date": dates,
+        "Employer": _zipf_choice(rng, [f"Employer {i}" for i in range(12)], rows),
+        "Description": rng.choice(np.array(["Salary", "Bonus", "Interest", "Dividend"], dtype=object), rows),
+        "Gross Income": gross_income,
+        "Salary Sacrifice": np.where(rng.random(rows) < 0.3, 150.0, np.nan),
+        "Tax": tax,
+        "Income": (gross_income - np.nan_to_num(tax)).round(2),
+        "Taxable": rng.integers(0, 3, rows),
+    })
+    deduction_rows = max(rows // 10, 1)
+    deductions = pd.DataFrame({
+        "Date": dates[rng.integers(0, rows, deduction_rows)],
+        "Description": rng.choice(np.array(["Work from home", "Donation", "Equipment"], dtype=object), deduction_rows),
+        "Amount": rng.gamma(2, 40, deduction_rows).round(2),
+    })
+    return {"Income": income, "Deductions": deductions}
+
+
+def write_workbook(path, sheets):
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def transactions(rows, account_ids, seed=0, years=3, transfer_share=0.02):
+    """
+    Up bank transactions as the client's CSV endpoint returns them.
+
+    With more than one account, `transfer_share` of them are transfers between accounts,
+    which appear once in each account.
+    """
+    rng = np.random.default_rng(seed)
+    created_at = pd.Timestamp.now(tz="Australia/Sydney").floor("s") - pd.to_timedelta(
+        rng.integers(0, years * 365 * 24 * 3600, rows), unit="s")
+    account_ids = np.asarray(account_ids, dtype=object)
+    transactions = pd.DataFrame({
+        "transactionId": [f"up-{i:09d}" for i in range(rows)],
+        "accountId": rng.choice(account_ids, rows),
+        "createdAt": created_at.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "description": _zipf_choice(rng, [f"Shop {i}" for i in range(SHOPS)], rows),
+        "amount": -rng.gamma(2, 15, rows).round(2),
+    })
+    if len(account_ids) > 1:
+        sent = transactions.sample(frac=transfer_share, random_state=seed)
+        offsets = rng.integers(1, len(account_ids), len(sent))
+        receiving = account_ids[(pd.Index(account_ids).get_indexer(sent["accountId"]) + offsets) % len(account_ids)]
+        transactions = pd.concat([transactions, sent.assign(
+            transactionId=sent["transactionId"] + "-in",
+            accountId=receiving,
+            description="Transfer",
+            amount=-sent["amount"],
+        )], ignore_index=True)
+    return transactions.sort_values("createdAt", ignore_index=True)
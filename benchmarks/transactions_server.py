@@ -0,0 +1,61 @@
+"""Local stand-in for the Up bank client's `/api/v1/transactions/csv` endpoint."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+
+
+def _to_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_convert(None) if timestamp.tzinfo else timestamp
+
+
+class TransactionsServer:
+    """
+    Serves `transactions` (see synthetic.transactions) filtered by the query parameters the
+    dashboard sends: startDate, endDate, numTransactions and accountId.
+    """
+
+    def __init__(self, transactions: pd.DataFrame, host="localhost", port=0):
+        self.transactions = transactions
+        self.created_at = pd.to_datetime(transactions["createdAt"], utc=True).dt.tz_convert(None)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                if url.path != "/api/v1/transactions/csv":
+                    self.send_error(404)
+                    return
+                body = server.csv(parse_qs(url.query)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.http_server = ThreadingHTTPServer((host, port), Handler)
+        self.uri = f"http://{host}:{self.http_server.server_port}"
+
+    def csv(self, query):
+        mask = (
+            (self.created_at >= _to_utc(query["startDate"][0]))
+            & (self.created_at < _to_utc(query["endDate"][0]))
+        )
+        if "accountId" in query:
+            mask &= self.transactions["accountId"] == query["accountId"][0]
+        limit = int(query.get("numTransactions", [10000])[0])
+        return self.transactions.loc[mask].drop(columns="accountId").head(limit).to_csv(index=False)
+
+    def __enter__(self):
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.http_server.shutdown()
+        self.http_server.server_close()
@@ -0,0 +1,136 @@
+"""
+Precompute the report aggregates for every financial year, for the pages to load.
+
+    python build_snapshot.py
+
+Loads both workbooks and the transaction store once and writes a new snapshot under
+SNAPSHOT_DIR, see report_snapshot. Meant to run from cron, e.g. nightly, as a snapshot is
+only used on the day it was computed and while the data it was computed from is unchanged.
+"""
+import argparse
+import logging
+import os
+import pandas as pd
+import streamlit.logger
+# The loaders are Streamlit cached, without a server they warn about it as they are defined
+streamlit.logger.set_log_level(logging.ERROR)
+import chart_data
+import derivations
+import report_snapshot
+import reports
+import spatial
+import transaction_store
+import utils
+
+
+BAR_CHART_COLUMNS = ["Tag", "Shop"]
+BAR_CHART_ITEMS = 20
+
+
+def _scoped(frames_by_scope):
+    """One frame of every scope's aggregate, told apart by their SCOPE_COLUMN."""
+    return pd.concat(
+        [frame.assign(**{report_snapshot.SCOPE_COLUMN: scope}) for scope, frame in frames_by_scope.items()],
+        ignore_index=True)
+
+
+def _by_financial_year(frame: pd.DataFrame, financial_years: pd.Series):
+    """The whole frame as ALL_YEARS, then the rows of each financial year."""
+    return {
+        report_snapshot.ALL_YEARS: frame,
+        **{label: frame.loc[financial_years == label] for label in financial_years.dropna().unique()},
+    }
+
+
+def tax_impact_aggregates(historical, start_date, end_date, today):
+    """
+    The tax impact of every scope at each resolution the income page can ask it at, named
+    by that resolution: over every row's dates, and for a financial year over its own.
+    """
+    by_resolution = {}
+    for scope, rows in historical.items():
+        ranges = [(start_date, end_date)]
+        if scope != report_snapshot.ALL_YEARS:
+            year_start, year_end = report_snapshot.financial_year_bounds(scope)
+            ranges.append((year_start, min(year_end, today)))
+        for range_start, range_end in ranges:
+            freq = chart_data.resolution(range_start, range_end)
+            by_resolution.setdefault(freq, {})[scope] = reports.tax_impact(rows, range_start, range_end)
+    return {f"tax impact {freq}": _scoped(frames) for freq, frames in by_resolution.items()}
+
+
+def income_aggregates(income_data: pd.DataFrame, today):
+    # The income page's date range starts out covering every row
+    start_date, end_date = income_data["Date"].min(), min(income_data["Date"].max(), today)
+    historical = {
+        scope: rows[rows["Date"] <= today]
+        for scope, rows in _by_financial_year(income_data, income_data["Financial Year"]).items()
+    }
+    return {
+        **tax_impact_aggregates(historical, start_date, end_date, today),
+        "income by financial year": _scoped(
+            {scope: reports.income_by_financial_year(rows) for scope, rows in historical.items()}),
+        "income by employer": _scoped(
+            {scope: reports.income_by_employer(rows) for scope, rows in historical.items()}),
+        "projected income": _scoped(
+            {scope: reports.projected_income(rows, today) for scope, rows in historical.items()}),
+    }
+
+
+def spending_aggregates(spending_rollup: pd.DataFrame, locations: pd.DataFrame):
+    scopes = _by_financial_year(spending_rollup, derivations.financial_year(spending_rollup["Date"]))
+    aggregates = {
+        f"top {BAR_CHART_ITEMS} {column} by Cost": _scoped(
+            {scope: reports.top_totals(rows, column, "Cost", BAR_CHART_ITEMS) for scope, rows in scopes.items()})
+        for column in BAR_CHART_COLUMNS
+    }
+    aggregates["category breakdown"] = _scoped(
+        {scope: reports.category_breakdown(rows) for scope, rows in scopes.items()})
+    aggregates["spending locations"] = _scoped(
+        {scope: spatial.location_points(rows, locations) for scope, rows in scopes.items()})
+    return aggregates
+
+
+def transaction_aggregates(transactions: pd.DataFrame):
+    if transactions.empty:
+        return {}
+    totals = reports.transactions_by_financial_year(
+        transactions, utils.TRANSACTION_DATE_COLUMN, utils.TRANSACTION_AMOUNT_COLUMN,
+        utils.TRANSACTION_ACCOUNT_COLUMN)
+    return {"transactions by financial year": _scoped(_by_financial_year(totals, totals["Financial Year"]))}
+
+
+def build(today):
+    # Taken before loading, so data changed meanwhile leaves the snapshot out of date
+    sources = utils.snapshot_sources()
+    income_data, _ = utils.fetch_income_deduction_data()
+    spending_rollup = utils.fetch_spending_rollup()
+    locations = utils.fetch_spending_locations()
+    store_path = os.getenv("TRANSACTION_STORE_PATH", utils.TRANSACTION_STORE_PATH)
+    # Only what was synced so far, the job never calls the bank
+    account_ids = utils.transaction_account_ids()
+    transactions = pd.concat([
+        transaction_store.query_transactions(store_path, pd.Timestamp.min, pd.Timestamp.max, [account_id])
+        .assign(**{utils.TRANSACTION_ACCOUNT_COLUMN: account_id})
+        for account_id in account_ids
+    ], ignore_index=True) if account_ids else utils.empty_transactions()
+    frames = {
+        **income_aggregates(income_data, today),
+        **spending_aggregates(spending_rollup, locations),
+        **transaction_aggregates(transactions),
+    }
+    return report_snapshot.write(frames, sources, today)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot-dir", help="Overrides the SNAPSHOT_DIR environment variable")
+    args = parser.parse_args()
+    if args.snapshot_dir:
+        os.environ["SNAPSHOT_DIR"] = args.snapshot_dir
+    manifest = build(pd.Timestamp.today().normalize())
+    print(f"Wrote snapshot {manifest['id']} with {len(manifest['frames'])} aggregates")
+
+
+if __name__ == "__main__":
+    main()
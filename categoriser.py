@@ -0,0 +1,134 @@
+import threading
+import numpy as np
+import pandas as pd
+
+
+LABEL_COLUMNS = ["Shop", "Item", "Tag", "Location"]
+
+
+def merchant_key(descriptions: pd.Series):
+    """
+    Descriptions reduced to the merchant's words, e.g. "WOOLWORTHS 1234 SYDNEY" to
+    "woolworths sydney". Numbers of three or more digits are store or reference numbers.
+    """
+    return (
+        descriptions.astype("string")
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.replace(r"\b\d{3,}\b", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .replace("", pd.NA)
+    )
+
+
+def _best_labels(counts: pd.Series):
+    """The most chosen value per merchant and the share of the merchant's choices it makes up."""
+    totals = counts.groupby(level="merchant").sum()
+    best = counts.sort_values(ascending=False, kind="stable").groupby(level="merchant").head(1)
+    return pd.DataFrame({
+        "value": best.index.get_level_values("value"),
+        # Discounted for merchants seen only a few times
+        "share": best.to_numpy() / (totals.reindex(best.index.get_level_values("merchant")).to_numpy() + 1),
+    }, index=best.index.get_level_values("merchant"))
+
+
+class CategoriserIndex:
+    """
+    How often each Shop, Item, Tag and Location was chosen for a merchant, and the
+    likeliest choice of each for every merchant.
+
+    `update` only recounts the merchants it is given, so saved rows are added as they come
+    rather than rebuilding the index from the whole history. What each row was counted as
+    is kept per merchant source, so an edited row replaces its old counts.
+    """
+
+    def __init__(self):
+        empty_counts = pd.Series(dtype="int64", index=pd.MultiIndex.from_arrays([[], []], names=["merchant", "value"]))
+        self.counts = {column: empty_counts for column in LABEL_COLUMNS}
+        self.best = {column: _best_labels(empty_counts) for column in LABEL_COLUMNS}
+        # {source: the merchant and labels each row, by Row ID, is counted with}
+        self.observations = {}
+        self.lock = threading.Lock()
+
+    def _recount(self, removed: pd.DataFrame, added: pd.DataFrame):
+        for column in LABEL_COLUMNS:
+            changes = pd.concat([
+                removed[["merchant", column]].assign(change=-1),
+                added[["merchant", column]].assign(change=1),
+            ]).rename(columns={column: "value"}).dropna()
+            if changes.empty:
+                continue
+            changes = changes.groupby(["merchant", "value"])["change"].sum()
+            counts = self.counts[column].add(changes, fill_value=0).astype("int64")
+            counts = counts.loc[counts > 0]
+            updated = changes.index.unique("merchant")
+            recounted = counts.loc[counts.index.get_level_values("merchant").isin(updated)]
+            self.counts[column] = counts
+            self.best[column] = pd.concat([
+                self.best[column].drop(index=updated, errors="ignore"),
+                _best_labels(recounted),
+            ])
+
+    def _replace(self, source, rows: pd.DataFrame):
+        """Count `rows` from `source` in place of what those rows were counted as before."""
+        observations = self.observations.get(source, rows.iloc[:0])
+        previous = observations.loc[observations.index.isin(rows.index)]
+        self.observations[source] = pd.concat([observations.drop(index=previous.index), rows])
+        self._recount(previous, rows)
+
+    def update(self, merchants: pd.Series, labels: pd.DataFrame, source="Shop"):
+        """
+        Count the `labels` rows as chosen for the `merchants`, both indexed by Row ID. Rows
+        already counted from `source` are counted again instead.
+        """
+        rows = pd.DataFrame({"merchant": merchant_key(merchants).to_numpy()}, index=labels.index)
+        for column in LABEL_COLUMNS:
+            rows[column] = labels[column].astype("string").to_numpy()
+        with self.lock:
+            self._replace(source, rows)
+
+    def relabel(self, labels: pd.DataFrame):
+        """Count the rows' new `labels` for the merchants they are already counted for."""
+        with self.lock:
+            for source, observations in list(self.observations.items()):
+                rows = observations.loc[observations.index.isin(labels.index), ["merchant"]]
+                for column in LABEL_COLUMNS:
+                    rows[column] = labels.loc[rows.index, column].astype("string").to_numpy()
+                self._replace(source, rows)
+
+    def remove(self, row_ids):
+        """Stop counting the rows, e.g. deleted ones."""
+        with self.lock:
+            for source, observations in list(self.observations.items()):
+                removed = observations.loc[observations.index.isin(row_ids)]
+                self.observations[source] = observations.drop(index=removed.index)
+                self._recount(removed, removed.iloc[:0])
+
+    def label(self, descriptions: pd.Series):
+        """
+        The likeliest Shop, Item, Tag and Location for each description, with a Confidence
+        that is the share of its least certain label, 0 for unknown merchants.
+        """
+        keys = merchant_key(descriptions)
+        labels = pd.DataFrame(index=descriptions.index)
+        shares = []
+        for column in LABEL_COLUMNS:
+            best = self.best[column].reindex(keys)
+            labels[column] = best["value"].to_numpy()
+            shares.append(best["share"].to_numpy(dtype=float))
+        # Labels never given for the merchant, e.g. no Location, do not count against it
+        labels["Confidence"] = np.nan_to_num(np.fmin.reduce(shares))
+        return labels
+
+
+def build_index(spending: pd.DataFrame, descriptions: pd.Series):
+    """
+    An index of the spending's labels, keyed by their Shop and by the description of the
+    bank transaction each row was matched to (`descriptions`, indexed by Row ID).
+    """
+    index = CategoriserIndex()
+    index.update(spending["Shop"], spending)
+    described = spending.loc[descriptions.index]
+    index.update(descriptions, described, source="description")
+    return index
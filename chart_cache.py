@@ -0,0 +1,106 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import timing
+
+
+# Charts whose spec and data are kept, shared by every session
+MAX_CHARTS = 128
+# Every spec reads its rows from this dataset, so new data leaves the spec unchanged and
+# the frontend swaps the chart's data rather than drawing it again
+DATASET_NAME = "chart_data"
+
+# Altair's themes are global, see _template
+_altair_lock = threading.Lock()
+
+
+def fingerprint(data: pd.DataFrame):
+    """A hash of the frame's columns, types and values, ignoring its index."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in data.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _template(build, data: pd.DataFrame):
+    """
+    The Vega-Lite spec of the Altair chart `build(data)` makes, without its data.
+
+    The chart is built on no rows, which still lets Altair infer the fields' types from
+    their dtypes. Streamlit draws Altair charts without Altair's default theme, as here.
+    """
+    import altair as alt
+
+    with _altair_lock, alt.theme.enable("none"):
+        spec = build(data.iloc[:0]).to_dict()
+    spec.pop("datasets", None)
+    spec["data"] = {"name": DATASET_NAME}
+    return spec
+
+
+def _arrow_bytes(data: pd.DataFrame):
+    from streamlit import dataframe_util
+
+    return dataframe_util.convert_anything_to_arrow_bytes(data)
+
+
+class ChartCache:
+    """
+    The spec template of each chart, and the Arrow payload of its latest data.
+
+    A chart's key must tell apart everything its builder takes other than the data, e.g.
+    the column or the title it shows. Its spec is built once, its data only serialised
+    again when the data's fingerprint changes.
+    """
+
+    def __init__(self, max_charts=MAX_CHARTS):
+        self.max_charts = max_charts
+        self.charts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.charts.get(key)
+            if entry is not None:
+                self.charts.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self.lock:
+            self.charts[key] = entry
+            self.charts.move_to_end(key)
+            while len(self.charts) > self.max_charts:
+                self.charts.popitem(last=False)
+
+    def vega_lite_spec(self, key, data: pd.DataFrame, build):
+        """
+        The spec of `build`'s Altair chart of `data`, ready for `st.vega_lite_chart`.
+
+        The span is marked "hit" when nothing was built or serialised, "data" when only the
+        data was serialised and "miss" when the spec was built too.
+        """
+        with timing.span(f"chart {key[0]}", cache="hit", rows=len(data)) as record:
+            data_fingerprint = fingerprint(data)
+            entry = self._get(key)
+            if entry is None:
+                record["cache"] = "miss"
+                entry = {"spec": _template(build, data), "fingerprint": None, "payload": None}
+            if entry["fingerprint"] != data_fingerprint:
+                if record["cache"] == "hit":
+                    record["cache"] = "data"
+                entry = {**entry, "fingerprint": data_fingerprint, "payload": _arrow_bytes(data)}
+            self._put(key, entry)
+            # Streamlit sends Arrow bytes in `datasets` as they are
+            return {**entry["spec"], "datasets": {DATASET_NAME: entry["payload"]}}
+
+    def figure(self, key, data: pd.DataFrame, build):
+        """`build(data)`, e.g. a Plotly figure, built again only when the data changes."""
+        with timing.span(f"chart {key[0]}", cache="hit", rows=len(data)) as record:
+            data_fingerprint = fingerprint(data)
+            entry = self._get(key)
+            if entry is None or entry["fingerprint"] != data_fingerprint:
+                record["cache"] = "miss"
+                entry = {"figure": build(data), "fingerprint": data_fingerprint}
+            self._put(key, entry)
+            return entry["figure"]
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import derivations
+
+
+# Bins a chart is drawn with at most, about one per pixel of a narrow chart
+MAX_BINS = 400
+# Points a series keeps after downsampling
+MAX_POINTS = 500
+# Coarsest last, as pandas period aliases
+RESOLUTIONS = {"D": "day", "W": "week", "M": "month"}
+
+
+def resolution(start_date, end_date, max_bins=MAX_BINS):
+    """The finest of day, week or month that splits [start, end] into at most `max_bins` bins."""
+    days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    for freq, days_per_bin in (("D", 1), ("W", 7)):
+        if days / days_per_bin <= max_bins:
+            return freq
+    return "M"
+
+
+def bin_series(frame: pd.DataFrame, date_column, value_columns, group_column=None,
+               start_date=None, end_date=None, max_bins=MAX_BINS):
+    """
+    `value_columns` summed per bin of `date_column`, and per `group_column` if given, with
+    the bins sized for [start_date, end_date], the frame's own dates by default.
+
+    Returns (binned, freq), the dates of `binned` being the start of each bin.
+    """
+    dates = frame[date_column]
+    if frame.empty:
+        return frame[[date_column, *([group_column] if group_column else []), *value_columns]], "D"
+    freq = resolution(
+        dates.min() if start_date is None else start_date,
+        dates.max() if end_date is None else end_date,
+        max_bins)
+    keys = [derivations.period_start(dates, freq).rename(date_column)]
+    if group_column:
+        keys.append(frame[group_column])
+    binned = frame.groupby(keys, observed=True, sort=True)[value_columns].sum().reset_index()
+    return binned, freq
+
+
+def lttb(x, y, threshold):
+    """
+    Positions of the `threshold` points of (x, y) picked by Largest Triangle Three Buckets,
+    which keeps the peaks and troughs that give a line its shape. `x` is sorted.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+    # The first and last points are kept, the rest split into threshold - 2 buckets
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for bucket in range(threshold - 2):
+        first, last = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_first, next_last = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_first, next_last = length - 1, length
+        next_x, next_y = x[next_first:next_last].mean(), y[next_first:next_last].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[first:last] - y[previous])
+            - (x[previous] - x[first:last]) * (next_y - y[previous]))
+        previous = first + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(frame: pd.DataFrame, date_column, value_columns, max_points=MAX_POINTS):
+    """
+    The rows of `frame`, sorted by `date_column`, that LTTB keeps for any of `value_columns`,
+    so each series keeps its shape in at most `max_points` points.
+    """
+    if len(frame) <= max_points:
+        return frame
+    frame = frame.sort_values(date_column, kind="stable")
+    x = frame[date_column].to_numpy("datetime64[ns]").astype(np.int64)
+    kept = np.unique(np.concatenate([
+        lttb(x, frame[column].to_numpy(dtype=float), max_points // len(value_columns))
+        for column in value_columns
+    ]))
+    return frame.iloc[kept]
+
+
+def time_series(frame: pd.DataFrame, date_column, value_columns, start_date=None, end_date=None):
+    """
+    `value_columns` binned for the range and downsampled, ready to be sent to a line or area
+    chart. Returns (points, freq).
+    """
+    binned, freq = bin_series(frame, date_column, value_columns, start_date=start_date, end_date=end_date)
+    return downsample(binned, date_column, value_columns), freq
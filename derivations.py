@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+
+def financial_year(dates: pd.Series):
+    """Vectorised `utils.calculate_financial_year`, e.g. "FY 2023/2024" for 2023-07-01."""
+    dates = pd.to_datetime(dates)
+    start_year = dates.dt.year - (dates.dt.month < 7)
+    # Only the handful of distinct years are formatted, every row is then a lookup
+    labels = {year: f"FY {year}/{year + 1}" for year in start_year.dropna().unique().astype(int)}
+    return start_year.map(labels).astype(object).where(dates.notna(), None)
+
+
+def taxable_income(income_data: pd.DataFrame):
+    # As the row-wise version counted it: Gross Income plus Tax for Taxable == 2 rows, the
+    # rest nothing
+    taxable = income_data["Taxable"]
+    return pd.Series(
+        np.where(taxable == 2, income_data["Gross Income"] + income_data["Tax"], 0),
+        index=income_data.index
+    )
+
+
+def period_start(dates: pd.Series, freq):
+    """Start of the period each date falls in, `freq` being a pandas period alias."""
+    return dates.dt.to_period(freq).dt.start_time
@@ -0,0 +1,62 @@
+import pandas as pd
+from streamlit.delta_generator import DeltaGenerator
+import timing
+
+
+def render_diagnostics(diagnostics: DeltaGenerator):
+    """How long each stage of the recent reruns took, drawn into the `diagnostics` container."""
+    spans = timing.spans_frame()
+    if spans.empty:
+        diagnostics.info("No timings recorded yet, open another page first.")
+        return
+
+    runs = (
+        spans.loc[spans["parent"].isna()]
+        .sort_values("start", ascending=False)
+        .assign(label=lambda df: (
+            pd.to_datetime(df["start"], unit="s").dt.strftime("%H:%M:%S")
+            + "  " + df["name"] + "  " + (df["duration"] * 1000).round(1).astype(str) + " ms"))
+    )
+    selected_run = diagnostics.selectbox(
+        "Run", options=runs["run"], format_func=runs.set_index("run")["label"].get)
+
+    diagnostics.subheader("Waterfall")
+    run_spans = (
+        spans.loc[spans["run"] == selected_run]
+        .sort_values("start")
+        .assign(
+            Stage=lambda df: [f"{position:>3} {'  ' * depth}{name}" for position, depth, name in zip(
+                range(len(df)), df["depth"], df["name"])],
+            **{
+                "Start (ms)": lambda df: df["offset"] * 1000,
+                "End (ms)": lambda df: (df["offset"] + df["duration"]) * 1000,
+                "Duration (ms)": lambda df: df["duration"] * 1000,
+                "Cache": lambda df: df["cache"].fillna("-"),
+            })
+    )
+    import altair as alt
+
+    diagnostics.altair_chart(alt.Chart(run_spans).mark_bar().encode(
+        x=alt.X("Start (ms)", title="Milliseconds since the start of the run"),
+        x2="End (ms)",
+        y=alt.Y("Stage", sort=None, title=None),
+        color=alt.Color("Cache"),
+        tooltip=["name", "Duration (ms)", "rows", "Cache", "thread"]
+    ), use_container_width=True)
+    diagnostics.dataframe(
+        run_spans[["Stage", "Duration (ms)", "rows", "Cache", "thread"]], hide_index=True)
+
+    diagnostics.subheader("Latency by stage")
+    diagnostics.dataframe(
+        spans.groupby("name")["duration"]
+        .describe(percentiles=[0.5, 0.9, 0.99])[["count", "50%", "90%", "99%", "max"]]
+        .mul({"count": 1, "50%": 1000, "90%": 1000, "99%": 1000, "max": 1000})
+        .sort_values("90%", ascending=False)
+        .rename(columns=lambda column: column if column == "count" else f"{column} (ms)"))
+
+    diagnostics.download_button(
+        "Export spans (JSON lines)",
+        data=timing.to_json_lines(timing.spans()),
+        file_name="spans.jsonl",
+        mime="application/jsonl")
+
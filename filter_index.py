@@ -0,0 +1,73 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+
+# Each index built is a new version of its dataset, e.g. after the workbook changed
+_versions = itertools.count()
+
+
+class FilterIndex:
+    """
+    Integer-code indexes over a frame's filter columns, built once per dataset.
+
+    Each categorical column is factorised into integer codes and the date column is kept as
+    a sorted index, so any combination of value selections and a date range resolves to one
+    array of row positions and a single `take` of the frame.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns, date_column=None):
+        self.df = df
+        self.version = next(_versions)
+        self.codes = {}
+        self.code_lookup = {}
+        for column in columns:
+            codes, uniques = pd.factorize(df[column])
+            self.codes[column] = codes
+            self.code_lookup[column] = {value: code for code, value in enumerate(uniques)}
+
+        self.date_column = date_column
+        self.date_order = None
+        if date_column is not None:
+            dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+            self.date_order = np.argsort(dates, kind="stable")
+            self.sorted_dates = dates[self.date_order]
+            # NaT sorts last, rows without a date never fall inside a range
+            self.dated_rows = len(dates) - np.count_nonzero(np.isnat(dates))
+
+    def _date_positions(self, start_date, end_date):
+        low = 0
+        high = self.dated_rows
+        if start_date is not None:
+            low = np.searchsorted(self.sorted_dates[:high], np.datetime64(pd.Timestamp(start_date)), "left")
+        if end_date is not None:
+            high = np.searchsorted(self.sorted_dates[:high], np.datetime64(pd.Timestamp(end_date)), "right")
+        return self.date_order[low:high]
+
+    def positions(self, selections=None, start_date=None, end_date=None):
+        """
+        Row positions matching every non-empty selection and the inclusive date range.
+
+        `selections` maps a column to the values to keep; an empty or missing selection
+        keeps every row, matching the sidebar's "nothing selected means everything".
+        """
+        mask = None
+        if start_date is not None or end_date is not None:
+            mask = np.zeros(len(self.df), dtype=bool)
+            mask[self._date_positions(start_date, end_date)] = True
+        for column, values in (selections or {}).items():
+            if not len(values):
+                continue
+            lookup = self.code_lookup[column]
+            selected_codes = [lookup[value] for value in values if value in lookup]
+            if any(pd.isna(value) for value in values):
+                # factorize gives missing values the code -1, `isin` lets them match NaN
+                selected_codes.append(-1)
+            column_mask = np.isin(self.codes[column], selected_codes)
+            mask = column_mask if mask is None else mask & column_mask
+        if mask is None:
+            return np.arange(len(self.df))
+        return np.flatnonzero(mask)
+
+    def select(self, selections=None, start_date=None, end_date=None):
+        return self.df.take(self.positions(selections, start_date, end_date))
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+import schema
+import workbook_cache
+
+
+COMPACT_DELAY_SECONDS = 30
+# Key of `DataFrame.attrs` holding the content hash of the workbook version a frame was read from
+WORKBOOK_DIGEST = "workbook_digest"
+
+# Held while appending and while folding the journal into the workbook
+_lock = threading.Lock()
+_compaction_timers = {}
+
+
+class StaleSnapshotError(Exception):
+    """The edits were made on a version of the workbook that has since been replaced."""
+
+
+def journal_path(workbook_path, workbook_digest):
+    """
+    Journal of row edits on top of one version of the workbook.
+
+    Row IDs only make sense against the workbook they were read from, so the journal is
+    named after that version's content hash, e.g. `.spending.xlsx.journal-<hash>.jsonl`.
+    """
+    head, tail = os.path.split(os.path.abspath(workbook_path))
+    return os.path.join(head, f".{tail}.journal-{workbook_digest[:16]}.jsonl")
+
+
+def _records(df: pd.DataFrame):
+    return df.astype(object).where(df.notna(), None).to_dict("index")
+
+
+def diff(snapshot: pd.DataFrame, edited: pd.DataFrame, columns):
+    """
+    The (inserted, updated, deleted) rows of `edited` compared to `snapshot` on `columns`.
+
+    Rows are matched on the index, the stable row ID. Rows of `edited` whose ID is not in
+    the snapshot are inserts, snapshot rows missing from `edited` are deletes.
+    """
+    before = snapshot[columns]
+    after = edited[columns]
+    inserted = after.loc[~after.index.isin(before.index)]
+    deleted = before.loc[~before.index.isin(after.index)]
+    common = after.index[after.index.isin(before.index)]
+    before_common = before.loc[common].astype(object)
+    after_common = after.loc[common].astype(object)
+    changed = (
+        before_common.ne(after_common) & ~(before_common.isna() & after_common.isna())
+    ).any(axis=1)
+    return inserted, after.loc[common[changed.to_numpy()]], deleted
+
+
+def _entries(workbook_path, workbook_digest):
+    try:
+        with open(journal_path(workbook_path, workbook_digest)) as journal:
+            return [json.loads(line) for line in journal]
+    except FileNotFoundError:
+        return []
+
+
+def append(workbook_path, workbook_digest, snapshot, inserted, updated, deleted, next_row_id):
+    """
+    Record the edits made on the `workbook_digest` version of the workbook.
+
+    Inserted rows are given IDs counting up from `next_row_id`, past any the journal already
+    gave out, and returned in the order of `inserted`. Raises StaleSnapshotError when the
+    workbook is no longer that version, e.g. compacted meanwhile, as the Row IDs of the
+    edits then point at other rows.
+    """
+    before = _records(snapshot.loc[updated.index.append(deleted.index), inserted.columns])
+    with _lock:
+        # Checked under the lock, which compaction holds until the journal is folded in
+        if workbook_cache.current_hash(workbook_path) != workbook_digest:
+            raise StaleSnapshotError(f"{workbook_path} changed since the edited rows were read")
+        next_row_id = max([next_row_id, *(entry["row"] + 1 for entry in _entries(workbook_path, workbook_digest))])
+        entries = [
+            {"row": next_row_id + offset, "before": None, "after": values}
+            for offset, values in enumerate(_records(inserted).values())
+        ] + [
+            {"row": int(row_id), "before": before[row_id], "after": values}
+            for row_id, values in _records(updated).items()
+        ] + [
+            {"row": int(row_id), "before": before[row_id], "after": None}
+            for row_id in deleted.index
+        ]
+        with open(journal_path(workbook_path, workbook_digest), "a") as journal:
+            for entry in entries:
+                journal.write(json.dumps(entry, default=str) + "\n")
+    return pd.RangeIndex(next_row_id, next_row_id + len(inserted))
+
+
+def net_changes(workbook_path, workbook_digest):
+    """
+    The net effect of the journal as {row ID: (before, after)}.
+
+    `before` is the row as it is in the workbook (None for inserted rows) and `after` its
+    latest values (None once deleted).
+    """
+    changes = {}
+    for entry in _entries(workbook_path, workbook_digest):
+        before = changes[entry["row"]][0] if entry["row"] in changes else entry["before"]
+        changes[entry["row"]] = (before, entry["after"])
+    # Rows inserted then deleted never reach the workbook
+    return {row_id: change for row_id, change in changes.items() if change != (None, None)}
+
+
+def changes_frame(changes, side, columns):
+    """The `before` (side 0) or `after` (side 1) rows of `net_changes` as a frame."""
+    rows = {row_id: change[side] for row_id, change in changes.items() if change[side] is not None}
+    return pd.DataFrame.from_dict(rows, orient="index", columns=columns).reindex(columns=columns)
+
+
+def _cell_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def compact(workbook_path, sheet_name, data_schema, date_format="YYYY-MM-DD"):
+    """Fold the journal into the workbook, writing only the edited rows' cells."""
+    import openpyxl
+
+    with _lock:
+        workbook_digest = workbook_cache.workbook_hash(workbook_path)
+        changes = net_changes(workbook_path, workbook_digest)
+        if not changes:
+            # A journal left for an older version means the workbook was edited elsewhere
+            # first, it stays on disk rather than being applied to rows it no longer matches
+            return
+
+        after, _ = schema.apply_schema(changes_frame(changes, 1, list(data_schema)), data_schema)
+        workbook = openpyxl.load_workbook(workbook_path)
+        sheet = workbook[sheet_name]
+        header = [cell.value for cell in sheet[1]]
+        columns = {name: position for position, name in enumerate(header, start=1) if name in data_schema}
+
+        def write_row(sheet_row, row_id):
+            for name, position in columns.items():
+                cell = sheet.cell(row=sheet_row, column=position, value=_cell_value(after.at[row_id, name]))
+                if isinstance(cell.value, datetime):
+                    cell.number_format = date_format
+
+        # Row IDs are data row positions, the header is sheet row 1
+        inserted = sorted(row_id for row_id, (values, _) in changes.items() if values is None)
+        for row_id in sorted(after.index.difference(inserted)):
+            write_row(row_id + 2, row_id)
+        # Inserted rows follow the workbook's last row, from the first ID the journal gave
+        # out, without the gaps left by rows inserted and deleted again
+        first_inserted = min(
+            (entry["row"] for entry in _entries(workbook_path, workbook_digest) if entry["before"] is None),
+            default=0)
+        for offset, row_id in enumerate(inserted):
+            write_row(first_inserted + offset + 2, row_id)
+        for row_id in sorted((row_id for row_id, (_, values) in changes.items() if values is None), reverse=True):
+            sheet.delete_rows(row_id + 2)
+
+        temporary_path = f"{workbook_path}.compacting"
+        workbook.save(temporary_path)
+        os.replace(temporary_path, workbook_path)
+        # Loaders check the workbook before the journal, so they have already moved on to the
+        # new version
+        os.remove(journal_path(workbook_path, workbook_digest))
+
+
+def schedule_compaction(workbook_path, compact_workbook, delay=COMPACT_DELAY_SECONDS):
+    """Compact after `delay` seconds without further saves, so bursts of edits write once."""
+    pending = _compaction_timers.pop(workbook_path, None)
+    if pending is not None:
+        pending.cancel()
+    timer = threading.Timer(delay, compact_workbook)
+    timer.daemon = True
+    _compaction_timers[workbook_path] = timer
+    timer.start()
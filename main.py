@@ -1,5 +1,10 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import utils
+import timing
+import diagnostics
 
 st.set_page_config(
     page_title="Manage Expenses",
@@ -10,6 +15,45 @@ st.write("""
 This is the landing page
 """)
 
-utils.fetch_income_deduction_data()
-utils.fetch_spending_data()
-utils.fetch_transaction_data()
\ No newline at end of file
+
+def warm_up(loaders):
+    """
+    Run the loaders concurrently so their caches are filled before another page needs them.
+
+    The page is already drawn while they run, each loader reports into its own placeholder.
+    """
+    script_run_ctx = get_script_run_ctx()
+    parent_span = timing.current()
+
+    def load(loader):
+        # Lets the loaders write to this session, e.g. fetch_transaction_data's errors
+        add_script_run_ctx(threading.current_thread(), script_run_ctx)
+        with timing.span(f"warm up {loader.__name__}", parent=parent_span):
+            return loader()
+
+    placeholders = {name: st.empty() for name in loaders}
+    for name, placeholder in placeholders.items():
+        placeholder.info(f"Loading {name.lower()}...")
+    with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="warm-up") as pool:
+        futures = {pool.submit(load, loader): name for name, loader in loaders.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                rows = timing.row_count(future.result())
+            except Exception as e:
+                placeholders[name].error(f"{name} failed to load: {e}")
+                continue
+            placeholders[name].success(f"{name} loaded" + (f" ({rows:,} rows)" if rows is not None else ""))
+
+
+with timing.span("page main"):
+    utils.workbook_watcher()
+    warm_up({
+        "Income and deductions": utils.fetch_income_deduction_data,
+        "Spending": utils.fetch_spending_data,
+        "Transactions": utils.fetch_transaction_data,
+    })
+
+# Only shown when opened with ?debug=1
+if st.query_params.get("debug") == "1":
+    diagnostics.render_diagnostics(st.expander("Diagnostics", expanded=True))
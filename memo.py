@@ -0,0 +1,77 @@
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+import timing
+
+
+def normalise_filters(selections=None, start_date=None, end_date=None):
+    """
+    Sidebar selections and a date range as a hashable key that is the same for the same
+    filter, whatever order the values were selected in. Empty selections keep every row,
+    so they are left out.
+    """
+    values = tuple(
+        (column, tuple(sorted(map(str, selected))))
+        for column, selected in sorted((selections or {}).items())
+        if len(selected)
+    )
+    dates = tuple(None if date is None else pd.Timestamp(date) for date in (start_date, end_date))
+    return values, dates
+
+
+def result_size(result):
+    """Bytes held by an aggregation's result, summed over tuples."""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(deep=True))
+    if isinstance(result, tuple):
+        return sum(result_size(item) for item in result)
+    return sys.getsizeof(result)
+
+
+class AggregationMemo:
+    """
+    Results of aggregations keyed by (dataset version, filter state, aggregation spec),
+    dropping the least recently used once they hold more than `budget` bytes.
+
+    Results are shared, callers must not modify them.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        spec = key[-1]
+        with timing.span(f"memo {spec[0] if isinstance(spec, tuple) else spec}", cache="hit") as record:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    return self.entries[key][0]
+            record["cache"] = "miss"
+            result = compute()
+            record["rows"] = timing.row_count(result)
+            self.put(key, result)
+            return result
+
+    def put(self, key, result):
+        size = result_size(result)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > self.budget:
+                return
+            self.entries[key] = (result, size)
+            self.size += size
+            while self.size > self.budget:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
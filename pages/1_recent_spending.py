@@ -1,19 +1,24 @@
 import streamlit as st
-import altair as alt
 import pandas as pd
 from streamlit.delta_generator import DeltaGenerator
 import utils
+import chart_data
+import timing
 
+@timing.timed()
 def render_recent_spending(
     recent: DeltaGenerator,
     filtered_dataframe: pd.DataFrame):
+    # Imported on first draw rather than when the server starts
+    import altair as alt
+
     recent.header("Past 30 Days Expenditures")
     recent.write('''
     The goal of this page is to provide a simple overview of the past 30 days.
     
     It is intended to be very minimal and at a glance.
     ''')
-    recent.sidebar.button("Refresh Data", on_click=utils.fetch_spending_data.clear)
+    recent.sidebar.button("Refresh Data", on_click=utils.refresh_spending_data)
     
     recent.metric("Total Cost", f"${round(filtered_dataframe.Cost.sum(),2)}")
     metrics = recent.container()
@@ -21,8 +26,10 @@ def render_recent_spending(
     metric_col1.metric("Discretionary", f"${round(filtered_dataframe.loc[lambda df: df.Category == 'Wants'].Cost.sum(),2)}")
     metric_col2.metric("Miscellaneous", f"${round(filtered_dataframe.loc[lambda df: df['Sub Category'] == 'Miscellaneous'].Cost.sum(),2)}")
     metric_col3.metric("Necessary", f"${round(filtered_dataframe.loc[lambda df: df.Category == 'Week by Week'].Cost.sum(),2)}")
+    # One bar per day and Sub Category rather than one per line item
+    daily_cost, _ = chart_data.bin_series(filtered_dataframe, "Date", ["Cost"], "Sub Category")
     recent.bar_chart(
-        filtered_dataframe,
+        daily_cost,
         x="Date",
         y="Cost",
         x_label="Date of Purchase",
@@ -32,27 +39,34 @@ def render_recent_spending(
 
     # Cost by Tag
     recent.subheader("Cost by Tag")
-    cost_by_tag = filtered_dataframe.groupby("Tag")["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
-    recent.altair_chart(alt.Chart(cost_by_tag).mark_bar().encode(
+    cost_by_tag = filtered_dataframe.groupby("Tag", observed=True)["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
+    utils.altair_chart(recent, ("recent cost by tag",), cost_by_tag, lambda data: alt.Chart(data).mark_bar().encode(
         x=alt.X('Tag', sort=None, title="Tag"),
         y=alt.Y('Cost', title="Total Cost"),
         color="Tag"
-    ), use_container_width=True)
+    ))
 
     # Cost by Shop
     recent.subheader("Cost by Shop")
-    cost_by_shop = filtered_dataframe.groupby("Shop")["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
-    recent.altair_chart(alt.Chart(cost_by_shop).mark_bar().encode(
+    cost_by_shop = filtered_dataframe.groupby("Shop", observed=True)["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
+    utils.altair_chart(recent, ("recent cost by shop",), cost_by_shop, lambda data: alt.Chart(data).mark_bar().encode(
         x=alt.X('Shop', sort=None, title="Shop"),
         y=alt.Y('Cost', title="Total Cost")
-    ), use_container_width=True)
+    ))
 
     # Cost by Location
     recent.subheader("Cost by Location")
-    cost_by_location = filtered_dataframe.groupby("Location")["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
-    recent.altair_chart(alt.Chart(cost_by_location).mark_bar().encode(
+    cost_by_location = filtered_dataframe.groupby("Location", observed=True)["Cost"].sum().reset_index().sort_values(by="Cost", ascending=False).head(20)
+    utils.altair_chart(recent, ("recent cost by location",), cost_by_location, lambda data: alt.Chart(data).mark_bar().encode(
         x=alt.X('Location', sort=None, title="Location"),
         y=alt.Y('Cost', title="Total Cost")
-    ), use_container_width=True)
+    ))
 
-render_recent_spending(st, utils.fetch_spending_data().loc[lambda df: df.Date > pd.Timestamp.now() - pd.DateOffset(months=1)])
\ No newline at end of file
+with timing.span("page recent spending"):
+    utils.workbook_watcher()
+    one_month_ago = pd.Timestamp.now() - pd.DateOffset(months=1)
+    render_recent_spending(
+        st,
+        # The page only shows breakdowns, so the daily rollup stands in for the line items
+        utils.fetch_spending_rollup(start_date=one_month_ago.normalize())
+        .loc[lambda df: df.Date > one_month_ago])
@@ -1,84 +1,100 @@
 import streamlit as st
-import pandas as pd
 from streamlit.delta_generator import DeltaGenerator
-import plotly.express as px
 import utils
+import query_backend
+import spatial
+import report_snapshot
+import timing
 
 
-def render_detailed_spending(
-        detailed: DeltaGenerator,
-        filtered_dataframe: pd.DataFrame):
+@timing.timed()
+def render_detailed_spending(detailed: DeltaGenerator):
 
     # Display some filters - date, tag etc.
-    tags = filtered_dataframe["Tag"].unique()
-    shops = filtered_dataframe["Shop"].dropna().unique()
-    sub_categories = filtered_dataframe['Sub Category'].unique()
-    categories = filtered_dataframe.Category.dropna().unique()
     detailed.sidebar.header("Filters")
-    detailed.sidebar.button("Refresh Data", on_click=utils.fetch_spending_data.clear)
-    start_date, end_date = utils.date_sidebar(detailed, filtered_dataframe, "Date")
+    detailed.sidebar.button("Refresh Data", on_click=utils.refresh_spending_data)
+    date_bounds = utils.fetch_spending_date_bounds()
+    start_date, end_date = utils.date_range_sidebar(detailed, *date_bounds)
+    # Only the months overlapping the selected range are read
+    spending_index = utils.spending_filter_index(start_date, end_date)
+    filtered_dataframe = spending_index.df
+    # The categories cover the whole history, so the options stay put when the date range changes
+    tags = filtered_dataframe["Tag"].cat.categories
+    shops = filtered_dataframe["Shop"].cat.categories
+    sub_categories = filtered_dataframe['Sub Category'].cat.categories
+    categories = filtered_dataframe.Category.cat.categories
     selected_tags = detailed.sidebar.multiselect("Tags", options=tags)
     selected_shops = detailed.sidebar.multiselect("Shops", options=shops)
     selected_sub_category = detailed.sidebar.multiselect("Sub Category", options=sub_categories)
     selected_category = detailed.sidebar.multiselect("Category", options=categories)
 
-    filtered_dataframe = (
-        filtered_dataframe
-        .loc[lambda df: df.Date >= pd.to_datetime(start_date)]
-        .loc[lambda df: df.Date <= pd.to_datetime(end_date)]
-        .loc[lambda df: df.Tag.isin(selected_tags) if selected_tags else [True] * len(df)]
-        .loc[lambda df: df.Shop.isin(selected_shops) if selected_shops else [True] * len(df)]
-        .loc[lambda df: df['Sub Category'].isin(selected_sub_category) if selected_sub_category else [True] * len(df)]
-        .loc[lambda df: df.Category.isin(selected_category) if selected_category else [True] * len(df)]
-    )
+    # Every selection resolves to one set of row positions through the cached indexes
+    selections = {
+        "Tag": selected_tags,
+        "Shop": selected_shops,
+        "Sub Category": selected_sub_category,
+        "Category": selected_category,
+    }
+    # Without ad-hoc filters the aggregates come from the nightly snapshot, if it is current
+    scope = report_snapshot.scope(selections, start_date, end_date, *date_bounds)
+    _, filtered_dataframe = utils.select_memoized(spending_index, selections, start_date, end_date)
+    # Charts group the daily rollup rather than the line items, memoized by the filter
+    rollup_query = query_backend.Query(
+        utils.spending_rollup_filter_index(start_date, end_date), selections, start_date, end_date)
+    rollup_key, filtered_rollup = utils.select_memoized(*rollup_query)
     # Header
     detailed.title("Detailed Spending Analysis")
+    rejected_rows = utils.fetch_rejected_spending_rows()
+    if not rejected_rows.empty:
+        detailed.warning(f"{len(rejected_rows)} spending rows have values that could not be read, they are treated as missing.")
+        detailed.expander("Unreadable rows").dataframe(rejected_rows)
     # Create columns for visualizations
     col1, col2 = detailed.columns(2)
 
     # Spending by Tag (Altair Bar Chart)
     with col1:
         col1.subheader("Spending by Tag")
-        col1.altair_chart(
-            utils.plot_bar_chart(
-                filtered_dataframe,
-                "Tag",
-                "Cost",
-                "Tag"
-            ), use_container_width=True
+        utils.plot_bar_chart(
+            col1,
+            filtered_rollup,
+            "Tag",
+            "Cost",
+            "Tag",
+            memo_key=rollup_key,
+            scope=scope,
+            query=rollup_query
         )
     
     # Spending by Shop (Altair Bar Chart)
     with col2:
         col2.subheader("Spending by Shop")
-        col2.altair_chart(
-            utils.plot_bar_chart(
-                filtered_dataframe,
-                "Shop", "Cost", "Shop"), 
-            use_container_width=True
-        )
+        utils.plot_bar_chart(
+            col2,
+            filtered_rollup,
+            "Shop", "Cost", "Shop", memo_key=rollup_key, scope=scope, query=rollup_query)
 
     # Spending by Category (Altair Bar Chart)
     with col1:
         col1.subheader("Spending Breakdown")
-        sunburst_data = (
-            filtered_dataframe.groupby(["Category", "Sub Category", "Sub Sub Category"])["Cost"]
-            .sum()
-            .reset_index()
-        )
-        sunburst_fig = px.sunburst(
-            sunburst_data,
+        sunburst_data = utils.from_snapshot("spending", scope, "category breakdown", lambda: utils.memoized(
+            rollup_key, "category breakdown", lambda: utils.data_backend().category_breakdown(rollup_query)))
+        import plotly.express as px
+
+        utils.plotly_chart(col1, ("spending breakdown",), sunburst_data, lambda data: px.sunburst(
+            data,
             path=["Category", "Sub Category", "Sub Sub Category"],
             values="Cost", 
             color="Sub Category",
             color_discrete_sequence=px.colors.qualitative.Prism,
-        )
-        col1.plotly_chart(sunburst_fig, use_container_width=True)
+        ))
 
     # Spending Map (if latitude and longitude are available)
     col2.subheader("Spending Map")
-    map_data = filtered_dataframe[["Latitude", "Longitude", "Cost", "Tag"]].dropna().rename(columns={"Latitude": "LAT", "Longitude": "LON"})
-    col2.map(map_data, size='Cost')
+    # A point per location, or per grid cell when there are too many locations to draw
+    locations = utils.from_snapshot("spending", scope, "spending locations", lambda: utils.memoized(
+        rollup_key, "locations", lambda: spatial.location_points(filtered_rollup, utils.fetch_spending_locations())))
+    map_data, _ = utils.memoized(rollup_key, "map", lambda: spatial.map_points(locations))
+    col2.map(map_data, size="Size")
  
     # Spending Details Word Cloud (using Details column)
     # if "Details" in filtered_dataframe.columns:
@@ -97,8 +113,10 @@ def render_detailed_spending(
     #     except ImportError:
     #         detailed.warning("Install `wordcloud` and `matplotlib` to see the Word Cloud.")
     st.subheader("Line items")
-    detailed.write(filtered_dataframe.astype(str))
+    utils.paged_table(detailed, filtered_dataframe, "line_items", lambda page: page.astype(str))
 
 
 st.set_page_config(layout="wide")
-render_detailed_spending(st, utils.fetch_spending_data())
\ No newline at end of file
+with timing.span("page detailed spending"):
+    utils.workbook_watcher()
+    render_detailed_spending(st)
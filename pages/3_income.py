@@ -1,30 +1,26 @@
 import streamlit as st
-import altair as alt
 import pandas as pd
 from streamlit.delta_generator import DeltaGenerator
-import plotly.express as px
 import utils
+import chart_data
+import derivations
+import report_snapshot
+import reports
+import timing
+from filter_index import FilterIndex
 
 
-def variable_income_aggregation(
-        income: DeltaGenerator,
-        income_data: pd.DataFrame):
-    # Gross Income Over Time
-    income.subheader("Gross Income Over Time with Breakdown")
-    time_aggregation = income.selectbox(
-        "Aggregate by:",
-        options=["Day", "Week", "Month", "Year"],
-        index=2  # Default to "Month"
-    )
+def aggregate_by_period(income_data: pd.DataFrame, time_aggregation):
     # Apply the selected aggregation
     if time_aggregation == "Day":
-        income_data["Period"] = income_data["Date"]
+        period = income_data["Date"]
     elif time_aggregation == "Week":
-        income_data["Period"] = income_data["Date"].dt.to_period("W").apply(lambda r: r.start_time)
+        period = derivations.period_start(income_data["Date"], "W")
     elif time_aggregation == "Month":
-        income_data["Period"] = income_data["Date"].dt.to_period("M").apply(lambda r: r.start_time)
+        period = derivations.period_start(income_data["Date"], "M")
     elif time_aggregation == "Year":
-        income_data["Period"] = income_data["Date"].dt.to_period("Y").apply(lambda r: r.start_time)
+        period = derivations.period_start(income_data["Date"], "Y")
+    income_data = income_data.assign(Period=period)
 
     # Aggregate gross income
     gross_income_by_period = (
@@ -43,30 +39,58 @@ def variable_income_aggregation(
         )
     else:
         breakdown_by_period = income_data.groupby("Period")["Gross Income"].sum().reset_index()
+    return gross_income_by_period, breakdown_by_period
+
+
+@timing.timed()
+def variable_income_aggregation(
+        income: DeltaGenerator,
+        income_key,
+        income_data: pd.DataFrame):
+    import altair as alt
+
+    # Gross Income Over Time
+    income.subheader("Gross Income Over Time with Breakdown")
+    time_aggregation = income.selectbox(
+        "Aggregate by:",
+        options=["Day", "Week", "Month", "Year"],
+        index=2  # Default to "Month"
+    )
+    # Memoized per aggregation, so only a new choice here regroups the data
+    gross_income_by_period, breakdown_by_period = utils.memoized(
+        income_key,
+        ("by period", time_aggregation),
+        lambda: aggregate_by_period(income_data, time_aggregation))
 
     y_axis = alt.Y("Gross Income:Q", title="Gross Income ($)", axis=alt.Axis(labelExpr='"$" + datum.value'))
 
     # Stacked bar chart for breakdown
-    bar_chart = alt.Chart(breakdown_by_period).mark_bar().encode(
-        x=alt.X("Period:T", title="Period"),
-        y=y_axis,
-        color=alt.Color("Description:N", title="Income Description"),
-        tooltip=["Period:T", "Description:N", "Gross Income:Q"]
-    ).properties(
-        title=f"Gross Income and Breakdown ({time_aggregation})"
-    )
+    def bar_chart(data):
+        return alt.Chart(data).mark_bar().encode(
+            x=alt.X("Period:T", title="Period"),
+            y=y_axis,
+            color=alt.Color("Description:N", title="Income Description"),
+            tooltip=["Period:T", "Description:N", "Gross Income:Q"]
+        ).properties(
+            title=f"Gross Income and Breakdown ({time_aggregation})"
+        )
     # Display the layered chart
-    income.altair_chart(bar_chart, use_container_width=True)
+    utils.altair_chart(income, ("income by period", time_aggregation), breakdown_by_period, bar_chart)
 
 
+@timing.timed()
 def render_income(
         income: DeltaGenerator,
-        income_data: pd.DataFrame,
+        income_index: FilterIndex,
         deductions_data: pd.DataFrame):
+    # Imported on first draw rather than when the server starts
+    import altair as alt
+    import plotly.express as px
 
     income.sidebar.button(
         "Refresh Data",
-        on_click=utils.fetch_income_deduction_data.clear)
+        on_click=utils.refresh_income_data)
+    income_data = income_index.df
     # income.write(income_data.columns.astype(str))
 
     employers = income_data.Employer.unique()
@@ -82,20 +106,16 @@ def render_income(
 
     start_date, end_date = utils.date_sidebar(income, income_data, "Date", True)
 
-    income_data = (
-        income_data
-        .loc[lambda df: df.Date >= pd.to_datetime(start_date)]
-        .loc[lambda df: df.Date <= pd.to_datetime(end_date)]
-        .loc[lambda df:
-             df.Employer.isin(selected_employers)
-             if selected_employers else [True] * len(df)]
-        .loc[lambda df:
-             df["Financial Year"].isin(selected_financial_year)
-             if selected_financial_year else [True] * len(df)]
-        .loc[lambda df:
-             df.Description.isin(selected_descriptions)
-             if selected_descriptions else [True] * len(df)]
-    )
+    selections = {
+        "Employer": selected_employers,
+        "Financial Year": selected_financial_year,
+        "Description": selected_descriptions,
+    }
+    # Without ad-hoc filters the aggregates come from the nightly snapshot, if it is current
+    scope = report_snapshot.scope(
+        selections, start_date, end_date, income_data["Date"].min(), income_data["Date"].max())
+    # The filtered rows and everything grouped from them are memoized by the filter
+    income_key, income_data = utils.select_memoized(income_index, selections, start_date, end_date)
 
     filtered_deduction = (
         deductions_data
@@ -103,70 +123,59 @@ def render_income(
         .loc[lambda df: df.Date < pd.to_datetime(end_date)]
     )
     # Filter historical and projected data
-    today = pd.Timestamp.today()
-    historical_data = income_data[income_data["Date"] <= today]
-    future_data = income_data[income_data["Date"] > today]
+    today = pd.Timestamp.today().normalize()
+    historical_data = utils.memoized(
+        income_key, ("historical", today), lambda: income_data[income_data["Date"] <= today])
 
     # Display the data table
     income.subheader("Income Data")
 
-    variable_income_aggregation(income, income_data)
+    variable_income_aggregation(income, income_key, income_data)
 
     # Income Breakdown by Financial Year
     income.subheader("Income Breakdown by Financial Year")
-    income_by_year = (
-        historical_data.groupby("Financial Year")[["Gross Income", "Tax", "Income"]]
-        .sum()
-        .reset_index()
-        .sort_values("Gross Income", ascending=False)
-    )
-    bar_chart = alt.Chart(income_by_year).mark_bar().encode(
+    income_by_year = utils.from_snapshot("income", scope, "income by financial year", lambda: utils.memoized(
+        income_key, ("by financial year", today), lambda: reports.income_by_financial_year(historical_data)))
+    utils.altair_chart(income, ("income by financial year",), income_by_year, lambda data: alt.Chart(data).mark_bar().encode(
         x=alt.X("Financial Year:N", title="Financial Year"),
         y=alt.Y("Gross Income:Q", title="Gross Income ($)", axis=alt.Axis(labelExpr='"$" + datum.value')),
         color=alt.Color("Financial Year:N", legend=None),
         tooltip=["Financial Year:N", "Gross Income:Q", "Tax:Q", "Income:Q"]
-    ).properties(title="Income Breakdown by Financial Year")
-    income.altair_chart(bar_chart, use_container_width=True)
+    ).properties(title="Income Breakdown by Financial Year"))
 
     # Tax Impact
     income.subheader("Tax Impact on Gross Income")
-    tax_impact_data = historical_data.groupby("Date")[["Gross Income", "Tax"]].sum().reset_index()
-    tax_chart = alt.Chart(tax_impact_data).transform_fold(
+    tax_end_date = min(pd.Timestamp(end_date), today)
+    freq = chart_data.resolution(start_date, tax_end_date)
+    tax_impact_data = utils.from_snapshot("income", scope, f"tax impact {freq}", lambda: utils.memoized(
+        income_key, ("tax impact", today), lambda: reports.tax_impact(historical_data, start_date, tax_end_date)))
+    utils.altair_chart(income, ("tax impact", freq), tax_impact_data, lambda data: alt.Chart(data).transform_fold(
         fold=["Gross Income", "Tax"],
         as_=["Category", "Value"]
     ).mark_area().encode(
         x=alt.X("Date:T", title="Date"),
-        y=alt.Y("Value:Q", title="Amount ($)", axis=alt.Axis(labelExpr='"$" + datum.value')),
+        y=alt.Y("Value:Q", title=f"Amount ($ per {chart_data.RESOLUTIONS[freq]})",
+                axis=alt.Axis(labelExpr='"$" + datum.value')),
         color="Category:N",
         tooltip=["Date:T", "Category:N", "Value:Q"]
-    ).properties(title="Tax and Gross Income Over Time")
-    income.altair_chart(tax_chart, use_container_width=True)
+    ).properties(title="Tax and Gross Income Over Time"))
 
     # Income Projections
     income.subheader("Projected Income")
-    recent_months = historical_data[historical_data["Date"] > today - pd.DateOffset(months=6)]
-    avg_monthly_income = recent_months["Income"].mean()
-    projection_data = pd.DataFrame({
-        "Date": pd.date_range(today + pd.DateOffset(days=1), periods=12, freq="ME"),
-        "Projected Income": avg_monthly_income
-    })
-    projection_chart = alt.Chart(projection_data).mark_line(point=True).encode(
+    projection_data = utils.from_snapshot(
+        "income", scope, "projected income", lambda: reports.projected_income(historical_data, today))
+    utils.altair_chart(income, ("projected income",), projection_data, lambda data: alt.Chart(data).mark_line(point=True).encode(
         x=alt.X("Date:T", title="Date"),
         y=alt.Y("Projected Income:Q", title="Projected Income ($)", axis=alt.Axis(labelExpr='"$" + datum.value')),
         tooltip=["Date:T", "Projected Income:Q"]
-    ).properties(title="Projected Monthly Income for Next 12 Months")
-    income.altair_chart(projection_chart, use_container_width=True)
+    ).properties(title="Projected Monthly Income for Next 12 Months"))
 
     # Employer Contributions
     income.subheader("Income by Employer")
-    income_by_employer = (
-        historical_data.groupby(["Employer", "Description"])[["Gross Income", "Salary Sacrifice", "Taxable Income", "Income", "Tax"]]
-        .sum()
-        .sort_values("Gross Income", ascending=False)
-        .reset_index()
-    )
-    sunburst = px.sunburst(income_by_employer, path=["Employer", "Description"], values="Gross Income")
-    income.plotly_chart(sunburst, use_container_width=True)
+    income_by_employer = utils.from_snapshot("income", scope, "income by employer", lambda: utils.memoized(
+        income_key, ("by employer", today), lambda: reports.income_by_employer(historical_data)))
+    utils.plotly_chart(income, ("income by employer",), income_by_employer, lambda data: px.sunburst(
+        data, path=["Employer", "Description"], values="Gross Income"))
 
     income.subheader("Table of income by employer")
     income.dataframe(
@@ -178,11 +187,13 @@ def render_income(
     summary_stats.loc["Net Income"] = summary_stats.loc["Gross Income"] - summary_stats.loc["Tax"]
     income.table(summary_stats)
 
-    income.dataframe(utils.format_income_table(income_data), hide_index=True)
+    utils.paged_table(income, income_data, "income", utils.format_income_table, hide_index=True)
     
     
 st.set_page_config(layout="wide")
-income_data, deductions_data = utils.fetch_income_deduction_data()
-render_income(st, income_data, deductions_data)
+with timing.span("page income"):
+    utils.workbook_watcher()
+    _, deductions_data = utils.fetch_income_deduction_data()
+    render_income(st, utils.income_filter_index(), deductions_data)
 
     
\ No newline at end of file
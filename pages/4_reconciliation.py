@@ -0,0 +1,52 @@
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+import utils
+import timing
+
+
+@timing.timed()
+def render_reconciliation(reconciliation: DeltaGenerator):
+    reconciliation.header("Reconciliation")
+    reconciliation.write('''
+    Up transactions matched to the spending line items they paid for, by transaction ID or
+    else by amount and date.
+    ''')
+    reconciliation.sidebar.button("Refresh Data", on_click=utils.refresh_spending_data)
+    start_date, end_date = utils.date_range_sidebar(reconciliation, *utils.fetch_spending_date_bounds())
+    matched, unmatched_transactions, unmatched_spending = utils.fetch_reconciliation(start_date, end_date)
+    unmatched_transactions = utils.account_sidebar(reconciliation, unmatched_transactions)
+
+    col1, col2, col3 = reconciliation.columns(3)
+    col1.metric("Matched line items", len(matched))
+    col2.metric("Unmatched transactions", len(unmatched_transactions))
+    col3.metric("Unmatched line items", len(unmatched_spending))
+
+    reconciliation.subheader("Unmatched transactions")
+    reconciliation.dataframe(unmatched_transactions, hide_index=True)
+    reconciliation.subheader("Unmatched line items")
+    reconciliation.dataframe(
+        unmatched_spending[["Date", "Item", "Cost", "Shop", "Receipt Ref", "transactionId"]].astype(str))
+    reconciliation.subheader("Matched line items")
+    reconciliation.dataframe(matched, hide_index=True)
+
+    reconciliation.subheader("Categorise unmatched transactions")
+    reconciliation.write('''
+    Spending rows for the unmatched transactions, labelled the way past spending at the same
+    merchant was. Check the labels, then add them to the spending.
+    ''')
+    categorised = utils.categorise_transactions(unmatched_transactions)
+    minimum_confidence = reconciliation.slider("Minimum confidence", 0.0, 1.0, 0.5)
+    categorised = reconciliation.data_editor(
+        categorised.loc[categorised["Confidence"] >= minimum_confidence],
+        hide_index=True,
+        disabled=["Confidence", "transactionId"],
+        key="categorised_transactions")
+    if reconciliation.button("Add to spending", disabled=categorised.empty):
+        utils.save_categorised_transactions(categorised)
+        reconciliation.success(f"Added {len(categorised)} rows to the spending.")
+
+
+st.set_page_config(layout="wide")
+with timing.span("page reconciliation"):
+    utils.workbook_watcher()
+    render_reconciliation(st)
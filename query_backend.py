@@ -0,0 +1,148 @@
+import itertools
+import threading
+import weakref
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import reports
+from filter_index import FilterIndex
+
+
+BACKENDS = ("pandas", "duckdb")
+POSITION_COLUMN = "_position"
+
+# Sidebar selections and an inclusive date range over the rows of a FilterIndex
+Query = namedtuple("Query", ["index", "selections", "start_date", "end_date"])
+
+
+def _sorted_groups(groups: pd.DataFrame, frame: pd.DataFrame, keys):
+    """Grouped rows in the order pandas' groupby gives them, with the keys' original dtypes."""
+    groups = groups.astype({key: frame[key].dtype for key in keys})
+    return groups.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+class PandasBackend:
+    """Filters through the FilterIndex's codes and groups with pandas, in this process."""
+
+    name = "pandas"
+
+    def select(self, query: Query):
+        return query.index.select(query.selections, query.start_date, query.end_date)
+
+    def top_totals(self, query: Query, x_column, y_column, max_items=20):
+        return reports.top_totals(self.select(query), x_column, y_column, max_items)
+
+    def category_breakdown(self, query: Query):
+        return reports.category_breakdown(self.select(query))
+
+
+class DuckDBBackend:
+    """
+    Filters and groups in an in-process DuckDB database, vectorised over all cores.
+
+    Each FilterIndex's frame is loaded into a table once, dropped again with the index.
+    Filtering only returns the matching row positions, and groups are put in the order and
+    dtypes pandas would give them, so results are those of PandasBackend.
+    """
+
+    name = "duckdb"
+
+    def __init__(self):
+        import duckdb
+
+        self.connection = duckdb.connect()
+        self.tables = weakref.WeakKeyDictionary()
+        self.table_ids = itertools.count()
+        # Re-entrant, as a table can be dropped by the garbage collector while one is made
+        self.lock = threading.RLock()
+
+    def _table(self, index: FilterIndex):
+        with self.lock:
+            if index not in self.tables:
+                import pyarrow
+
+                name = f"frame_{next(self.table_ids)}"
+                arrow_table = pyarrow.Table.from_pandas(index.df, preserve_index=False).append_column(
+                    POSITION_COLUMN, pyarrow.array(np.arange(len(index.df))))
+                self.connection.execute(f"CREATE TABLE {name} AS SELECT * FROM arrow_table")
+                self.tables[index] = name
+                weakref.finalize(index, self._drop, name)
+            return self.tables[index]
+
+    def _drop(self, name):
+        with self.lock:
+            self.connection.execute(f"DROP TABLE IF EXISTS {name}")
+
+    def _where(self, query: Query, not_null=()):
+        """A WHERE clause with the same meaning as FilterIndex.positions, and its parameters."""
+        clauses, parameters = [], []
+        for column, values in (query.selections or {}).items():
+            if not len(values):
+                continue
+            present = [value for value in values if not pd.isna(value)]
+            matches = [f'"{column}" IN ({", ".join("?" * len(present))})'] if present else []
+            if len(present) < len(values):
+                matches.append(f'"{column}" IS NULL')
+            clauses.append(f"({' OR '.join(matches) or 'FALSE'})")
+            parameters.extend(present)
+        date_column = query.index.date_column
+        if query.start_date is not None:
+            clauses.append(f'"{date_column}" >= ?')
+            parameters.append(pd.Timestamp(query.start_date).to_pydatetime())
+        if query.end_date is not None:
+            clauses.append(f'"{date_column}" <= ?')
+            parameters.append(pd.Timestamp(query.end_date).to_pydatetime())
+        clauses.extend(f'"{column}" IS NOT NULL' for column in not_null)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), parameters
+
+    def _fetch(self, sql, parameters, fetch):
+        # A cursor per query, as one connection cannot run queries from several threads
+        with self.connection.cursor() as cursor:
+            return fetch(cursor.execute(sql, parameters))
+
+    def select(self, query: Query):
+        table = self._table(query.index)
+        where, parameters = self._where(query)
+        positions = self._fetch(
+            f"SELECT {POSITION_COLUMN} FROM {table} {where} ORDER BY {POSITION_COLUMN}",
+            parameters,
+            lambda result: result.fetchnumpy()[POSITION_COLUMN])
+        return query.index.df.take(np.asarray(positions, dtype=np.int64))
+
+    def _group_sum(self, query: Query, keys, value_column):
+        table = self._table(query.index)
+        where, parameters = self._where(query, not_null=keys)
+        key_list = ", ".join(f'"{key}"' for key in keys)
+        groups = self._fetch(
+            f'SELECT {key_list}, COALESCE(SUM("{value_column}"), 0) AS "{value_column}" '
+            f"FROM {table} {where} GROUP BY {key_list}",
+            parameters,
+            lambda result: result.df())
+        return _sorted_groups(groups, query.index.df, keys)
+
+    def top_totals(self, query: Query, x_column, y_column, max_items=20):
+        return (
+            self._group_sum(query, [x_column], y_column)
+            .sort_values(by=y_column, ascending=False)
+            .head(max_items)
+        )
+
+    def category_breakdown(self, query: Query):
+        keys = ["Category", "Sub Category", "Sub Sub Category"]
+        # plotly cannot build the hierarchy from categorical columns
+        return self._group_sum(query, keys, "Cost").astype({key: str for key in keys})
+
+
+def create(name):
+    """The backend called `name`, pandas when DuckDB is asked for but not installed."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown query backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name == "duckdb":
+        # Imported only when asked for, the pandas backend needs neither
+        try:
+            import duckdb
+            import pyarrow
+        except ImportError:
+            return PandasBackend()
+        return DuckDBBackend()
+    return PandasBackend()
@@ -0,0 +1,89 @@
+import threading
+import numpy as np
+import pandas as pd
+
+
+def merge_ranges(ranges):
+    """
+    Sorted (start, end, *extra) ranges with overlapping or adjacent ones merged.
+
+    Only ranges with the same extra fields, e.g. when they were synced, are merged, see
+    overlay_range to replace part of a range with other fields.
+    """
+    merged = []
+    for start, end, *extra in sorted(ranges):
+        if merged and start <= merged[-1][1] and tuple(extra) == merged[-1][2:]:
+            merged_start, merged_end, *_ = merged[-1]
+            merged[-1] = (merged_start, max(merged_end, end), *extra)
+            continue
+        merged.append((start, end, *extra))
+    return merged
+
+
+def overlay_range(ranges, start, end, *extra):
+    """Merged `ranges` with [start, end) given the `extra` fields, cut out of those it overlaps."""
+    kept = []
+    for range_start, range_end, *range_extra in ranges:
+        if range_start < start:
+            kept.append((range_start, min(range_end, start), *range_extra))
+        if range_end > end:
+            kept.append((max(range_start, end), range_end, *range_extra))
+    return merge_ranges([*kept, (start, end, *extra)])
+
+
+def missing_ranges(ranges, start, end):
+    """The (start, end) parts of [start, end) not covered by the `ranges`, sorted by start."""
+    missing = []
+    cursor = start
+    for range_start, range_end, *_ in ranges:
+        if range_end <= cursor:
+            continue
+        if range_start >= end:
+            break
+        if range_start > cursor:
+            missing.append((cursor, range_start))
+        cursor = max(cursor, range_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+class RangeCache:
+    """
+    Rows of a date ordered source held in memory per key, e.g. an account's transactions.
+
+    Only the parts of a requested [start, end) that are not already held are loaded, with
+    `load(key, start, end)`, and the held rows are sliced to the range. `dates(frame)` gives
+    the naive timestamps the rows are ordered and sliced by.
+    """
+
+    def __init__(self, load, dates):
+        self.load = load
+        self.dates = dates
+        self.held = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, start_date, end_date):
+        with self.lock:
+            ranges, frame, dates = self.held.get(key, ([], pd.DataFrame(), np.array([], "datetime64[ns]")))
+            missing = missing_ranges(ranges, start_date, end_date)
+            if missing:
+                loaded = [self.load(key, start, end) for start, end in missing]
+                loaded = [part for part in loaded if not part.empty]
+                if loaded:
+                    frame = pd.concat([frame, *loaded], ignore_index=True)
+                    dates = np.concatenate(
+                        [dates, *(self.dates(part).to_numpy("datetime64[ns]") for part in loaded)])
+                    order = np.argsort(dates, kind="stable")
+                    frame, dates = frame.take(order).reset_index(drop=True), dates[order]
+                ranges = merge_ranges([*ranges, *missing])
+                self.held[key] = (ranges, frame, dates)
+        first, last = np.searchsorted(
+            dates, [pd.Timestamp(start_date).to_datetime64(), pd.Timestamp(end_date).to_datetime64()])
+        return frame.iloc[first:last].reset_index(drop=True)
+
+    def discard(self, key):
+        with self.lock:
+            self.held.pop(key, None)
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+
+DATE_TOLERANCE = pd.Timedelta(days=3)
+# Up reports times with an offset, spending dates are local days
+LOCAL_TIMEZONE = "Australia/Sydney"
+# Rounds of as-of matching, each one retries what lost a receipt to a nearer transaction
+MATCH_ROUNDS = 3
+
+
+def _cents(amounts):
+    return (pd.to_numeric(amounts, errors="coerce") * 100).round()
+
+
+def receipt_codes(spending: pd.DataFrame):
+    """
+    A receipt number for each line item, shared by the items of one receipt.
+
+    Items are on the same receipt when they have the same Receipt Ref on the same day,
+    an item without a Receipt Ref is a receipt of its own.
+    """
+    own_receipt = pd.Series(-1 - np.arange(len(spending)), index=spending.index)
+    receipt_ref = spending["Receipt Ref"].astype("Float64").fillna(own_receipt)
+    return spending.groupby(
+        [spending["Date"].dt.normalize(), receipt_ref], dropna=False, sort=False).ngroup().to_numpy()
+
+
+def _match_amounts(debits: pd.DataFrame, receipts: pd.DataFrame, tolerance):
+    """Pairs of (debit position, receipt) with the same cents, nearest in date, one to one."""
+    pairs = []
+    for _ in range(MATCH_ROUNDS):
+        if debits.empty or receipts.empty:
+            break
+        candidates = pd.merge_asof(
+            debits, receipts, on="date", by="cents", direction="nearest", tolerance=tolerance
+        ).dropna(subset=["receipt"])
+        # As-of joins can give a receipt to several debits, it goes to the nearest of them
+        candidates = (
+            candidates.assign(gap=(candidates["date"] - candidates["receipt date"]).abs())
+            .sort_values("gap", kind="stable")
+            .drop_duplicates("receipt")
+        )
+        if candidates.empty:
+            break
+        pairs.append(candidates[["position", "receipt"]])
+        debits = debits.loc[~debits["position"].isin(candidates["position"])]
+        receipts = receipts.loc[~receipts["receipt"].isin(candidates["receipt"])]
+    if not pairs:
+        return pd.DataFrame({"position": [], "receipt": []}, dtype="int64")
+    return pd.concat(pairs).astype("int64")
+
+
+def reconcile(spending: pd.DataFrame, transactions: pd.DataFrame, id_column, date_column, amount_column,
+              tolerance=DATE_TOLERANCE):
+    """
+    Match bank transactions to the spending line items they paid for.
+
+    Line items whose transaction ID is in `transactions` match it directly, as do the other
+    items on their receipt. Remaining debits are matched to remaining receipts, whose
+    items' Cost add up to the same amount, nearest in date within `tolerance`. The amount
+    match uses sorted as-of joins rather than comparing every pair.
+
+    Returns (matched, unmatched_bank, unmatched_spending). `matched` has a row per matched
+    line item with its Row ID, transaction ID and how it was matched, the unmatched frames
+    are the rows of `transactions` and `spending` left over.
+    """
+    row_ids = spending.index.to_numpy()
+    receipts = receipt_codes(spending)
+    bank_ids = transactions[id_column].astype(str) if not transactions.empty else pd.Series(dtype=str)
+
+    # Items on a receipt with a known transaction all belong to it
+    known = spending[id_column].isin(bank_ids).fillna(False).to_numpy()
+    known_receipts = pd.Series(spending[id_column].to_numpy()[known], index=receipts[known])
+    known_receipts = known_receipts.loc[~known_receipts.index.duplicated()]
+    by_id = np.isin(receipts, known_receipts.index)
+    matched = [pd.DataFrame({
+        "Row ID": row_ids[by_id],
+        id_column: known_receipts.reindex(receipts[by_id]).to_numpy(),
+        "Match": np.where(known[by_id], "transaction ID", "receipt"),
+    })]
+
+    if not transactions.empty:
+        cents = _cents(transactions[amount_column])
+        debits = pd.DataFrame({
+            "date": pd.to_datetime(transactions[date_column], utc=True)
+            .dt.tz_convert(LOCAL_TIMEZONE).dt.tz_localize(None).to_numpy("datetime64[ns]"),
+            "cents": -cents.to_numpy(),
+            "position": np.arange(len(transactions)),
+        }).loc[lambda df: ~bank_ids.isin(known_receipts).to_numpy() & (df["cents"] > 0)]
+        unmatched_rows = pd.DataFrame({
+            "receipt date": spending["Date"].to_numpy("datetime64[ns]"),
+            "cents": _cents(spending["Cost"]).to_numpy(),
+            "receipt": receipts,
+        }).loc[~by_id]
+        receipt_totals = (
+            unmatched_rows.groupby("receipt", sort=False)
+            .agg(**{"receipt date": ("receipt date", "min"), "cents": ("cents", "sum")})
+            .reset_index()
+            .dropna()
+            .assign(date=lambda df: df["receipt date"])
+        )
+        pairs = _match_amounts(
+            debits.dropna().astype({"cents": "int64"}).sort_values("date"),
+            receipt_totals.astype({"cents": "int64"}).sort_values("date"),
+            tolerance)
+        transaction_by_receipt = pd.Series(
+            bank_ids.to_numpy()[pairs["position"].to_numpy()], index=pairs["receipt"].to_numpy())
+        by_amount = np.isin(receipts, transaction_by_receipt.index)
+        matched.append(pd.DataFrame({
+            "Row ID": row_ids[by_amount],
+            id_column: transaction_by_receipt.reindex(receipts[by_amount]).to_numpy(),
+            "Match": "amount and date",
+        }))
+
+    matched = pd.concat(matched, ignore_index=True)
+    unmatched_bank = transactions.loc[~bank_ids.isin(matched[id_column]).to_numpy()]
+    unmatched_spending = spending.loc[~spending.index.isin(matched["Row ID"])]
+    return matched, unmatched_bank, unmatched_spending
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+from datetime import datetime
+import pandas as pd
+
+
+# Bump whenever the aggregates written change shape, older snapshots are then ignored
+SNAPSHOT_FORMAT = 2
+# Next to this module rather than the working directory, which differs when run from cron
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+MANIFEST_NAME = "current.json"
+KEEP_SNAPSHOTS = 3
+# Scope of the aggregates over every financial year, the others are scoped to one year
+ALL_YEARS = "All"
+SCOPE_COLUMN = "Scope"
+
+
+def snapshot_dir():
+    return os.getenv("SNAPSHOT_DIR", SNAPSHOT_DIR)
+
+
+def file_version(path):
+    """Cheap stamp of a file's content, None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def financial_year_bounds(label):
+    """First and last day of a financial year label such as "FY 2023/2024"."""
+    start_year = int(label[3:7])
+    return pd.Timestamp(start_year, 7, 1), pd.Timestamp(start_year + 1, 6, 30)
+
+
+def scope(selections, start_date, end_date, minimum_date, maximum_date):
+    """
+    The snapshot scope a page's filter amounts to, None for an ad-hoc filter.
+
+    That is ALL_YEARS for the whole date range with nothing selected, and a financial year
+    when it is the only one selected over the whole range, or the date range is exactly it.
+    """
+    selected_years = list(selections.get("Financial Year", []))
+    if any(len(values) for column, values in selections.items() if column != "Financial Year"):
+        return None
+    dates = (pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize())
+    if dates == (pd.Timestamp(minimum_date).normalize(), pd.Timestamp(maximum_date).normalize()):
+        if not selected_years:
+            return ALL_YEARS
+        return selected_years[0] if len(selected_years) == 1 else None
+    if selected_years:
+        return None
+    start_year = dates[0].year - (dates[0].month < 7)
+    label = f"FY {start_year}/{start_year + 1}"
+    return label if dates == financial_year_bounds(label) else None
+
+
+def write(frames, sources, as_of, directory=None):
+    """
+    Write `frames`, each with a SCOPE_COLUMN, as a new snapshot of the `sources` versions
+    computed on the day `as_of`, then make it the current one.
+    """
+    directory = directory or snapshot_dir()
+    snapshot_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    temporary_path = os.path.join(directory, f".{snapshot_id}.tmp")
+    os.makedirs(temporary_path)
+    names = {}
+    for position, (name, frame) in enumerate(frames.items()):
+        filename = f"{position}.parquet"
+        frame.to_parquet(os.path.join(temporary_path, filename), index=False)
+        names[name] = filename
+    os.replace(temporary_path, os.path.join(directory, snapshot_id))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "id": snapshot_id,
+        "as_of": pd.Timestamp(as_of).strftime("%Y-%m-%d"),
+        "sources": sources,
+        "frames": names,
+    }
+    # Swapped in whole so the pages never read a partial manifest
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(f"{manifest_path}.tmp", "w") as temporary:
+        json.dump(manifest, temporary)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    for old_id in sorted(entry for entry in os.listdir(directory) if entry[:1].isdigit())[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(directory, old_id), ignore_errors=True)
+    return manifest
+
+
+def read_manifest(directory=None):
+    try:
+        with open(os.path.join(directory or snapshot_dir(), MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(manifest, sources, today):
+    """
+    Whether the snapshot was computed today from the `sources`, {name: version}, as they
+    are now. Sources not given, e.g. the transaction store for income, are not checked.
+    """
+    return (
+        manifest is not None
+        and manifest["format"] == SNAPSHOT_FORMAT
+        and manifest["as_of"] == pd.Timestamp(today).strftime("%Y-%m-%d")
+        and all(manifest["sources"].get(name) == version for name, version in sources.items())
+    )
+
+
+def load(manifest, directory=None):
+    """The snapshot's frames as {name: {scope: frame}}, so any aggregate is one lookup."""
+    path = os.path.join(directory or snapshot_dir(), manifest["id"])
+    return {
+        name: {
+            scope: frame.drop(columns=SCOPE_COLUMN).reset_index(drop=True)
+            for scope, frame in pd.read_parquet(os.path.join(path, filename)).groupby(SCOPE_COLUMN, sort=False)
+        }
+        for name, filename in manifest["frames"].items()
+    }
@@ -0,0 +1,82 @@
+import pandas as pd
+import chart_data
+import derivations
+import reconcile
+
+
+INCOME_TOTAL_COLUMNS = ["Gross Income", "Salary Sacrifice", "Taxable Income", "Income", "Tax"]
+# Months of income the projection averages
+PROJECTION_MONTHS = 6
+
+
+def income_by_financial_year(historical_data: pd.DataFrame):
+    return (
+        historical_data.groupby("Financial Year")[["Gross Income", "Tax", "Income"]]
+        .sum()
+        .reset_index()
+        .sort_values("Gross Income", ascending=False)
+    )
+
+
+def income_by_employer(historical_data: pd.DataFrame):
+    return (
+        historical_data.groupby(["Employer", "Description"])[INCOME_TOTAL_COLUMNS]
+        .sum()
+        .sort_values("Gross Income", ascending=False)
+        .reset_index()
+    )
+
+
+def tax_impact(historical_data: pd.DataFrame, start_date, end_date):
+    """Gross Income and Tax over [start_date, end_date], binned by `chart_data.resolution`."""
+    points, _ = chart_data.time_series(historical_data, "Date", ["Gross Income", "Tax"], start_date, end_date)
+    return points
+
+
+def projected_income(historical_data: pd.DataFrame, today):
+    """Income for the next 12 month ends, the average of the last PROJECTION_MONTHS months."""
+    recent_months = historical_data[historical_data["Date"] > today - pd.DateOffset(months=PROJECTION_MONTHS)]
+    return pd.DataFrame({
+        "Date": pd.date_range(today + pd.DateOffset(days=1), periods=12, freq="ME"),
+        "Projected Income": recent_months["Income"].mean()
+    })
+
+
+def top_totals(dataframe: pd.DataFrame, x_column, y_column, max_items=20):
+    return (
+        dataframe.groupby(x_column, observed=True)[y_column]
+        .sum()
+        .reset_index()
+        .sort_values(by=y_column, ascending=False)
+        .head(max_items)
+    )
+
+
+def category_breakdown(spending_rollup: pd.DataFrame):
+    return (
+        spending_rollup.groupby(["Category", "Sub Category", "Sub Sub Category"], observed=True)["Cost"]
+        .sum()
+        .reset_index()
+        # plotly cannot build the hierarchy from categorical columns
+        .astype({"Category": str, "Sub Category": str, "Sub Sub Category": str})
+    )
+
+
+def transactions_by_financial_year(transactions: pd.DataFrame, date_column, amount_column, account_column):
+    """Debits, credits and the number of transactions per account and financial year."""
+    amounts = pd.to_numeric(transactions[amount_column], errors="coerce")
+    dates = (
+        pd.to_datetime(transactions[date_column], utc=True)
+        .dt.tz_convert(reconcile.LOCAL_TIMEZONE).dt.tz_localize(None)
+    )
+    return (
+        pd.DataFrame({
+            account_column: transactions[account_column],
+            "Financial Year": derivations.financial_year(dates),
+            "Debits": -amounts.clip(upper=0),
+            "Credits": amounts.clip(lower=0),
+        })
+        .groupby([account_column, "Financial Year"])
+        .agg(Debits=("Debits", "sum"), Credits=("Credits", "sum"), Transactions=("Debits", "size"))
+        .reset_index()
+    )
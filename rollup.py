@@ -0,0 +1,42 @@
+import pandas as pd
+import schema
+
+
+ROLLUP_DIMENSIONS = [
+    "Date",
+    "Category",
+    "Sub Category",
+    "Sub Sub Category",
+    "Tag",
+    "Shop",
+    "Location",
+]
+
+
+def build_spending_rollup(df: pd.DataFrame):
+    """
+    Daily Cost totals over every dimension the dashboard breaks spending down by.
+
+    Missing dimension values are kept as their own groups, so grouping the rollup by any
+    subset of ROLLUP_DIMENSIONS gives the same sums as grouping the line items.
+    """
+    return (
+        df.assign(Date=df["Date"].dt.normalize())
+        .groupby(ROLLUP_DIMENSIONS, dropna=False, observed=True)
+        .agg(**{"Cost": ("Cost", "sum"), "Line Items": ("Cost", "size")})
+        .reset_index()
+    )
+
+
+def apply_changes(rollup: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame):
+    """The rollup with the `removed` line items taken out and the `added` ones put in."""
+    removed_rollup = build_spending_rollup(removed)
+    removed_rollup[["Cost", "Line Items"]] *= -1
+    combined = (
+        schema.concat([rollup, removed_rollup, build_spending_rollup(added)])
+        .groupby(ROLLUP_DIMENSIONS, dropna=False, observed=True)[["Cost", "Line Items"]]
+        .sum()
+        .reset_index()
+    )
+    # Groups whose every line item was removed disappear, as they would from the line items
+    return combined.loc[combined["Line Items"] > 0]
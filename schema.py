@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+def _coerce(values: pd.Series, dtype):
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(values, errors="coerce").astype(dtype)
+    if dtype in ("float64", "Float64"):
+        return pd.to_numeric(values, errors="coerce").astype(dtype)
+    if dtype == "Int64":
+        numbers = pd.to_numeric(values, errors="coerce")
+        # Fractional values are invalid rather than silently truncated
+        return numbers.where(np.isclose(numbers, numbers.round())).round().astype(dtype)
+    if dtype == "category":
+        return values.astype("category")
+    return values.astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame, schema):
+    """
+    Coerce the columns of `df` to the dtypes declared in `schema`.
+
+    Values that cannot be converted become missing. Returns the coerced frame and the
+    original rows that had at least one such value, with a "Invalid Columns" column
+    naming the offending columns. Columns in the schema but not in the frame are skipped.
+    """
+    coerced_df = df.copy()
+    invalid_columns = pd.Series("", index=df.index)
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        coerced = _coerce(values, dtype)
+        invalid = values.notna() & coerced.isna()
+        invalid_columns[invalid] += f"{column}, "
+        coerced_df[column] = coerced
+
+    invalid_rows = invalid_columns != ""
+    rejected = df.loc[invalid_rows].astype(str).assign(
+        **{"Invalid Columns": invalid_columns[invalid_rows].str.rstrip(", ")})
+    return coerced_df, rejected
+
+
+def concat(frames):
+    """`pd.concat` that keeps categorical columns categorical when the frames' categories differ."""
+    frames = list(frames)
+    for column in frames[0].select_dtypes("category").columns:
+        categories = [
+            frame[column].cat.categories if isinstance(frame[column].dtype, pd.CategoricalDtype)
+            else pd.Index(frame[column].dropna().unique())
+            for frame in frames
+        ]
+        dtype = pd.CategoricalDtype(categories[0].append(categories[1:]).unique())
+        frames = [frame.assign(**{column: frame[column].astype(dtype)}) for frame in frames]
+    return pd.concat(frames)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+
+# Points a map is sent at most, denser data is gridded into cells
+MAX_MAP_POINTS = 1000
+# Web map zoom levels cells are built for, coarsest first
+ZOOM_LEVELS = range(4, 17, 2)
+# Cells across one map tile, so a cell is drawn around 32 pixels wide
+CELLS_PER_TILE = 8
+# Radius of the location with the most spending, in meters
+MAX_RADIUS = 400
+METERS_PER_DEGREE = 111_320
+
+
+def location_points(rollup: pd.DataFrame, locations: pd.DataFrame):
+    """
+    A point per location in the spending `rollup`, with its Cost and Visits, the days
+    something was bought there, placed by the Latitude and Longitude in `locations`.
+    """
+    totals = (
+        rollup.groupby("Location", observed=True)
+        .agg(Cost=("Cost", "sum"), Visits=("Date", "nunique"))
+        .reset_index()
+        .astype({"Location": str})
+    )
+    coordinates = locations[["Location", "Latitude", "Longitude"]].drop_duplicates("Location")
+    return (
+        totals.merge(coordinates.astype({"Location": str}), on="Location", how="inner")
+        .dropna(subset=["Latitude", "Longitude"])
+        .reset_index(drop=True)
+    )
+
+
+def cell_size(zoom):
+    """Width of a grid cell at `zoom`, in degrees."""
+    return 360 / 2 ** zoom / CELLS_PER_TILE
+
+
+def grid_cells(points: pd.DataFrame, zoom):
+    """
+    The `points` collapsed into square cells at `zoom`, summing their Cost and Visits.
+    A cell sits at the visit weighted centre of its points rather than its corner.
+    """
+    size = cell_size(zoom)
+    weights = points["Visits"].clip(lower=1)
+    return (
+        points.assign(
+            row=np.floor(points["Latitude"] / size),
+            column=np.floor(points["Longitude"] / size),
+            weighted_latitude=points["Latitude"] * weights,
+            weighted_longitude=points["Longitude"] * weights,
+            weight=weights,
+        )
+        .groupby(["row", "column"])
+        .agg(
+            Cost=("Cost", "sum"),
+            Visits=("Visits", "sum"),
+            Locations=("Location", "size"),
+            weighted_latitude=("weighted_latitude", "sum"),
+            weighted_longitude=("weighted_longitude", "sum"),
+            weight=("weight", "sum"),
+        )
+        .assign(
+            Latitude=lambda df: df["weighted_latitude"] / df["weight"],
+            Longitude=lambda df: df["weighted_longitude"] / df["weight"],
+        )
+        .reset_index(drop=True)[["Latitude", "Longitude", "Cost", "Visits", "Locations"]]
+    )
+
+
+def map_points(points: pd.DataFrame, max_points=MAX_MAP_POINTS):
+    """
+    The `points` ready for `st.map`, as they are when there are few enough, otherwise as the
+    cells of the finest zoom level that has at most `max_points` of them.
+
+    Returns (map_data, zoom), `zoom` being None when the points are not gridded. The map's
+    LAT and LON are the points' or cells' positions, Size is their radius in meters.
+    """
+    zoom = None
+    if len(points) > max_points:
+        for zoom in reversed(ZOOM_LEVELS):
+            cells = grid_cells(points, zoom)
+            if len(cells) <= max_points:
+                break
+        points = cells
+    # Area rather than radius grows with Cost, so large totals do not cover the map
+    radius = MAX_RADIUS if zoom is None else cell_size(zoom) * METERS_PER_DEGREE / 2
+    largest = points["Cost"].abs().max() if not points.empty else 0
+    size = radius * np.sqrt(points["Cost"].abs() / largest) if largest else radius
+    map_data = points.rename(columns={"Latitude": "LAT", "Longitude": "LON"}).assign(Size=size)
+    return map_data, zoom
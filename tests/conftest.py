@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope="session")
+def line_items():
+    """Synthetic spending line items joined like the workbook's, with gaps in every dimension."""
+    sheets = synthetic.spending_sheets(5000)
+    spending = sheets["Spending"]
+    rng = np.random.default_rng(1)
+    # Times of day, which the rollup drops, and missing values in every dimension
+    spending["Date"] = spending["Date"] + pd.to_timedelta(rng.integers(0, 86400, len(spending)), unit="s")
+    for column in ["Tag", "Shop", "Location"]:
+        spending.loc[rng.random(len(spending)) < 0.05, column] = None
+    spending.loc[rng.random(len(spending)) < 0.05, "Item"] = "Not in the hierarchy"
+    hierarchy = (
+        sheets["Base Table"]
+        .rename(columns={"All Items": "Item"})
+        .merge(sheets["Middle Table"], on="Sub Sub Category")
+        .merge(sheets["Top_Table"], on="Sub Category")
+    )
+    df, _ = utils._join_spending(spending, hierarchy, sheets["Location"])
+    return df
@@ -0,0 +1,48 @@
+import pandas as pd
+import categoriser
+
+
+def rows(shops, items, start=0):
+    return pd.DataFrame(
+        {"Shop": shops, "Item": items, "Tag": "Groceries", "Location": pd.NA},
+        index=pd.RangeIndex(start, start + len(shops)),
+    )
+
+
+def test_update_counts_labels_by_merchant():
+    index = categoriser.CategoriserIndex()
+    spending = rows(["Woolworths", "Woolworths", "Coles"], ["Milk", "Milk", "Bread"])
+    index.update(spending["Shop"], spending)
+    labels = index.label(pd.Series(["WOOLWORTHS", "coles", "ALDI"]))
+    assert labels["Item"].tolist()[:2] == ["Milk", "Bread"]
+    assert pd.isna(labels["Item"].iloc[2])
+    assert labels["Confidence"].tolist() == [2 / 3, 1 / 2, 0]
+
+
+def test_updated_rows_replace_their_previous_labels():
+    index = categoriser.CategoriserIndex()
+    spending = rows(["Woolworths"] * 3, ["Milk", "Milk", "Bread"])
+    index.update(spending["Shop"], spending)
+    edited = spending.assign(Item="Bread")
+    index.relabel(edited)
+    index.update(edited["Shop"], edited)
+    assert index.counts["Item"].to_dict() == {("woolworths", "Bread"): 3}
+    assert index.label(pd.Series(["WOOLWORTHS"]))["Item"].tolist() == ["Bread"]
+
+
+def test_relabel_keeps_the_description_rows_were_counted_for():
+    index = categoriser.CategoriserIndex()
+    spending = rows(["Woolworths", "Woolworths"], ["Milk", "Milk"])
+    index.update(spending["Shop"], spending)
+    index.update(pd.Series(["WOOLWORTHS 1234 SYDNEY", "WOOLWORTHS 1234 SYDNEY"]), spending, source="description")
+    index.relabel(spending.assign(Item="Bread").iloc[:1])
+    assert index.counts["Item"].loc["woolworths sydney"].to_dict() == {"Bread": 1, "Milk": 1}
+
+
+def test_removed_rows_are_no_longer_counted():
+    index = categoriser.CategoriserIndex()
+    spending = pd.concat([rows(["Coles"], ["Bread"]), rows(["Woolworths"], ["Milk"], start=1)])
+    index.update(spending["Shop"], spending)
+    index.remove(pd.Index([0]))
+    assert index.counts["Item"].to_dict() == {("woolworths", "Milk"): 1}
+    assert "coles" not in index.best["Item"].index
@@ -0,0 +1,101 @@
+import os
+import pandas as pd
+import pytest
+import journal
+import utils
+import workbook_cache
+from benchmarks import synthetic
+
+
+COLUMNS = list(utils.SPENDING_DATA_SCHEMA)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "spending.xlsx")
+    synthetic.write_workbook(path, synthetic.spending_sheets(40))
+    return path
+
+
+def read_spending(path):
+    return utils._read_spending_workbook(path)["spending"][COLUMNS]
+
+
+def save(path, snapshot, edited, digest=None):
+    inserted, updated, deleted = journal.diff(snapshot, edited, COLUMNS)
+    journal.append(
+        path, digest or workbook_cache.workbook_hash(path), snapshot, inserted, updated, deleted,
+        next_row_id=len(snapshot))
+
+
+def edit(snapshot):
+    """Row 1's Cost changed, row 2 deleted and two rows inserted."""
+    edited = snapshot.drop(index=2)
+    edited.loc[1, "Cost"] = 123.45
+    inserted = snapshot.iloc[[5, 6]].assign(Details=["first", "second"])
+    inserted.index = [-1, -2]
+    return pd.concat([edited, inserted])
+
+
+def test_append_rejects_edits_of_another_workbook_version(workbook):
+    snapshot = read_spending(workbook)
+    with pytest.raises(journal.StaleSnapshotError):
+        save(workbook, snapshot, edit(snapshot), digest="0" * 64)
+    assert journal.net_changes(workbook, workbook_cache.workbook_hash(workbook)) == {}
+
+
+def test_net_changes_replay_the_journal(workbook):
+    snapshot = read_spending(workbook)
+    digest = workbook_cache.workbook_hash(workbook)
+    save(workbook, snapshot, edit(snapshot))
+    rows = len(snapshot)
+
+    changes = journal.net_changes(workbook, digest)
+    assert sorted(changes) == [1, 2, rows, rows + 1]
+    assert changes[1][0]["Cost"] == snapshot.loc[1, "Cost"]
+    assert changes[1][1]["Cost"] == 123.45
+    assert changes[2][1] is None
+    assert changes[rows][0] is None
+    assert [changes[row][1]["Details"] for row in [rows, rows + 1]] == ["first", "second"]
+
+    # Rows inserted then deleted drop out, and new IDs count past them
+    saved = pd.concat([snapshot, journal.changes_frame(changes, 1, COLUMNS)])
+    saved = saved.loc[~saved.index.duplicated(keep="last")].drop(index=2)
+    save(workbook, saved, saved.drop(index=rows))
+    saved = saved.drop(index=rows)
+    save(workbook, saved, pd.concat([saved, snapshot.iloc[[7]].set_axis([-1])]))
+    changes = journal.net_changes(workbook, digest)
+    assert sorted(changes) == [1, 2, rows + 1, rows + 2]
+
+
+def test_compaction_writes_the_edits_into_the_workbook(workbook):
+    snapshot = read_spending(workbook)
+    digest = workbook_cache.workbook_hash(workbook)
+    save(workbook, snapshot, edit(snapshot))
+    rows = len(snapshot)
+    # The first inserted row is deleted again before compaction
+    changes = journal.net_changes(workbook, digest)
+    saved = pd.concat([snapshot, journal.changes_frame(changes, 1, COLUMNS)])
+    saved = saved.loc[~saved.index.duplicated(keep="last")].drop(index=2)
+    save(workbook, saved, saved.drop(index=rows))
+
+    journal.compact(workbook, utils.SPENDING_SHEET_NAME, utils.SPENDING_DATA_SCHEMA)
+
+    assert not os.path.exists(journal.journal_path(workbook, digest))
+    expected = pd.concat([
+        snapshot.drop(index=2).assign(Cost=lambda df: df["Cost"].where(df.index != 1, 123.45)),
+        snapshot.iloc[[6]].assign(Details="second"),
+    ]).reset_index(drop=True)
+    compacted = read_spending(workbook).reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        compacted.astype(object), expected.astype(object), check_index_type=False)
+
+
+def test_compacted_journal_rejects_later_saves_of_the_old_version(workbook):
+    snapshot = read_spending(workbook)
+    digest = workbook_cache.workbook_hash(workbook)
+    save(workbook, snapshot, edit(snapshot))
+    journal.compact(workbook, utils.SPENDING_SHEET_NAME, utils.SPENDING_DATA_SCHEMA)
+    with pytest.raises(journal.StaleSnapshotError):
+        save(workbook, snapshot, snapshot.drop(index=3), digest)
+    assert not os.path.exists(journal.journal_path(workbook, digest))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import query_backend
+import rollup
+import utils
+from filter_index import FilterIndex
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture(scope="module", params=["line items", "rollup"])
+def index(request, line_items):
+    frame = line_items if request.param == "line items" else rollup.build_spending_rollup(line_items)
+    return FilterIndex(frame, utils.SPENDING_FILTER_COLUMNS, "Date")
+
+
+@pytest.fixture(scope="module")
+def backends():
+    return query_backend.create("pandas"), query_backend.create("duckdb")
+
+
+def queries(index):
+    df = index.df
+    tags = list(df["Tag"].cat.categories[:2])
+    shops = list(df["Shop"].cat.categories[:5])
+    middle = df["Date"].min() + (df["Date"].max() - df["Date"].min()) / 2
+    return [
+        ({}, None, None),
+        ({"Tag": tags}, None, None),
+        ({"Tag": [*tags, np.nan], "Shop": shops}, df["Date"].min(), middle),
+        ({"Category": []}, middle.normalize(), None),
+        ({"Sub Category": list(df["Sub Category"].cat.categories[:3])}, None, middle.normalize()),
+        ({"Tag": ["Not a tag"]}, None, None),
+    ]
+
+
+def assert_same(pandas_result, duckdb_result):
+    # Empty groupings differ only in the width of their categorical codes
+    assert pandas_result.dtypes.equals(duckdb_result.dtypes)
+    pd.testing.assert_frame_equal(pandas_result, duckdb_result, check_exact=False, check_categorical=False)
+
+
+def test_select_matches(index, backends):
+    pandas_backend, duckdb_backend = backends
+    for selections, start_date, end_date in queries(index):
+        query = query_backend.Query(index, selections, start_date, end_date)
+        pd.testing.assert_frame_equal(pandas_backend.select(query), duckdb_backend.select(query))
+
+
+@pytest.mark.parametrize("column", ["Tag", "Shop", "Location"])
+def test_top_totals_match(index, backends, column):
+    pandas_backend, duckdb_backend = backends
+    for selections, start_date, end_date in queries(index):
+        query = query_backend.Query(index, selections, start_date, end_date)
+        assert_same(pandas_backend.top_totals(query, column, "Cost"), duckdb_backend.top_totals(query, column, "Cost"))
+
+
+def test_category_breakdown_matches(index, backends):
+    pandas_backend, duckdb_backend = backends
+    for selections, start_date, end_date in queries(index):
+        query = query_backend.Query(index, selections, start_date, end_date)
+        assert_same(pandas_backend.category_breakdown(query), duckdb_backend.category_breakdown(query))
@@ -0,0 +1,38 @@
+import pandas as pd
+from range_cache import merge_ranges, missing_ranges, overlay_range
+
+
+def day(n):
+    return pd.Timestamp("2025-01-01") + pd.Timedelta(days=n)
+
+
+def test_merge_ranges_merges_overlapping_and_adjacent():
+    assert merge_ranges([(day(5), day(8)), (day(0), day(2)), (day(2), day(4)), (day(6), day(10))]) == [
+        (day(0), day(4)), (day(5), day(10))]
+
+
+def test_merge_ranges_keeps_ranges_synced_at_different_times_apart():
+    assert merge_ranges([(day(0), day(4), day(4)), (day(4), day(9), day(9)), (day(9), day(12), day(9))]) == [
+        (day(0), day(4), day(4)), (day(4), day(12), day(9))]
+
+
+def test_missing_ranges():
+    ranges = [(day(2), day(4)), (day(6), day(8))]
+    assert missing_ranges(ranges, day(0), day(10)) == [(day(0), day(2)), (day(4), day(6)), (day(8), day(10))]
+    assert missing_ranges(ranges, day(2), day(4)) == []
+    assert missing_ranges(ranges, day(3), day(7)) == [(day(4), day(6))]
+    assert missing_ranges([], day(0), day(1)) == [(day(0), day(1))]
+
+
+def test_missing_ranges_of_overlapping_ranges():
+    ranges = [(day(0), day(5), day(5)), (day(3), day(4), day(9))]
+    assert missing_ranges(ranges, day(0), day(8)) == [(day(5), day(8))]
+
+
+def test_overlay_range_splits_the_ranges_it_covers():
+    ranges = [(day(0), day(10), day(10))]
+    assert overlay_range(ranges, day(3), day(12), day(12)) == [
+        (day(0), day(3), day(10)), (day(3), day(12), day(12))]
+    assert overlay_range(ranges, day(3), day(5), day(12)) == [
+        (day(0), day(3), day(10)), (day(3), day(5), day(12)), (day(5), day(10), day(10))]
+    assert overlay_range(ranges, day(10), day(11), day(10)) == [(day(0), day(11), day(10))]
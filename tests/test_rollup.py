@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+import rollup
+
+
+@pytest.mark.parametrize("keys", [
+    ["Tag"],
+    ["Shop"],
+    ["Location"],
+    ["Category", "Sub Category", "Sub Sub Category"],
+    ["Date", "Sub Category"],
+])
+def test_rollup_sums_match_line_items(line_items, keys):
+    spending_rollup = rollup.build_spending_rollup(line_items)
+    expected = (
+        line_items.assign(Date=line_items["Date"].dt.normalize())
+        .groupby(keys, dropna=False, observed=True)["Cost"]
+        .agg(["sum", "size"])
+    )
+    actual = spending_rollup.groupby(keys, dropna=False, observed=True).agg(
+        sum=("Cost", "sum"), size=("Line Items", "sum"))
+
+    pd.testing.assert_series_equal(actual["sum"], expected["sum"], check_exact=False)
+    pd.testing.assert_series_equal(actual["size"], expected["size"], check_dtype=False)
@@ -0,0 +1,85 @@
+import threading
+import time
+import pandas as pd
+import pytest
+import utils
+
+
+NOW = pd.Timestamp("2025-03-01 12:00")
+
+
+def test_fresh_ranges_extend_a_recent_sync_to_now():
+    synced = [(NOW - pd.Timedelta(days=30), NOW - pd.Timedelta(minutes=5), NOW - pd.Timedelta(minutes=5))]
+    assert utils._fresh_ranges(synced, NOW) == [(NOW - pd.Timedelta(days=30), NOW)]
+
+
+def test_fresh_ranges_trim_the_tail_of_a_stale_sync():
+    synced_at = NOW - pd.Timedelta(hours=1)
+    synced = [(NOW - pd.Timedelta(days=30), synced_at, synced_at)]
+    assert utils._fresh_ranges(synced, NOW) == [(NOW - pd.Timedelta(days=30), synced_at - utils.TRANSACTION_SYNC_OVERLAP)]
+
+
+def test_fresh_ranges_trim_a_stale_sync_that_ends_in_the_future():
+    synced_at = NOW - pd.Timedelta(hours=1)
+    synced = [(NOW - pd.Timedelta(days=30), NOW + pd.Timedelta(days=5), synced_at)]
+    assert utils._fresh_ranges(synced, NOW) == [(NOW - pd.Timedelta(days=30), synced_at - utils.TRANSACTION_SYNC_OVERLAP)]
+
+
+def test_fresh_ranges_keep_a_settled_range():
+    synced = [(NOW - pd.Timedelta(days=60), NOW - pd.Timedelta(days=30), NOW - pd.Timedelta(days=1))]
+    assert utils._fresh_ranges(synced, NOW) == [synced[0][:2]]
+
+
+@pytest.fixture
+def requests(monkeypatch, tmp_path):
+    """The windows sync_transactions asks the bank for, against an empty store."""
+    monkeypatch.setenv("TRANSACTION_STORE_PATH", str(tmp_path / "transactions.db"))
+    requested = []
+
+    def fetch_transactions(start_date, end_date, account_id):
+        requested.append((start_date, end_date))
+        return pd.DataFrame()
+
+    monkeypatch.setattr(utils, "fetch_transactions", fetch_transactions)
+    return requested
+
+
+def test_stale_sync_ending_in_the_future_is_fresh_again_once_its_tail_is_synced(requests):
+    # Reconciliation pads its window past now, the default window ends at now
+    assert utils.sync_transactions(NOW - pd.Timedelta(days=30), NOW + pd.Timedelta(days=4), "account", NOW)
+
+    later = NOW + pd.Timedelta(hours=1)
+    assert utils.sync_transactions(later - pd.DateOffset(months=1), later, "account", later)
+    assert requests[-1] == (NOW - utils.TRANSACTION_SYNC_OVERLAP, later)
+
+    # The tail was just synced, so it is fresh until the TTL passes again
+    for minutes in [5, 10]:
+        now = later + pd.Timedelta(minutes=minutes)
+        assert not utils.sync_transactions(now - pd.DateOffset(months=1), now, "account", now)
+    assert len(requests) == 2
+    stale = later + 2 * utils.TRANSACTION_TAIL_TTL
+    assert utils.sync_transactions(stale - pd.DateOffset(months=1), stale, "account", stale)
+    assert requests[-1] == (later - utils.TRANSACTION_SYNC_OVERLAP, stale)
+
+
+def test_requests_of_every_account_share_the_worker_bound(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRANSACTION_STORE_PATH", str(tmp_path / "transactions.db"))
+    lock = threading.Lock()
+    running = []
+    most_running = []
+
+    def request_transactions(session, start_date, end_date, account_id):
+        with lock:
+            running.append(account_id)
+            most_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(account_id)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(utils, "_request_transactions", request_transactions)
+    accounts = [f"account {n}" for n in range(3)]
+    utils.fetch_transaction_data(NOW - pd.DateOffset(months=6), NOW, accounts)
+    # Seven month shards for each account
+    assert len(most_running) == 21
+    assert max(most_running) == utils.TRANSACTIONS_MAX_WORKERS
@@ -0,0 +1,144 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+
+
+MAX_SPANS = 20000
+
+# Finished spans, newest last, shared by every session of the server process
+_spans = deque(maxlen=MAX_SPANS)
+_spans_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def row_count(result):
+    """Rows in a loader's result, summed over tuples of frames, None for anything else."""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, tuple):
+        counts = [row_count(item) for item in result]
+        return sum(counts) if counts and None not in counts else None
+    if hasattr(result, "df"):
+        return row_count(result.df)
+    return None
+
+
+def current():
+    """The innermost open span on this thread, None outside any span."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name, parent=None, **fields):
+    """
+    Time the enclosed block as `name`, nested under the enclosing span on this thread.
+
+    A span without a parent starts a new run, e.g. one rerun of a page or one background
+    rebuild. `parent` continues a span from another thread, for work handed to a pool.
+    Fields such as `rows` or `cache` can be passed or set on the yielded dict.
+    """
+    stack = _stack()
+    parent = stack[-1] if stack else parent
+    record = {
+        "run": parent["run"] if parent else uuid.uuid4().hex[:12],
+        "id": uuid.uuid4().hex[:12],
+        "parent": parent["id"] if parent else None,
+        "depth": parent["depth"] + 1 if parent else 0,
+        "name": name,
+        "thread": threading.current_thread().name,
+        "start": time.time(),
+        "duration": None,
+        "rows": None,
+        "cache": None,
+        **fields,
+    }
+    stack.append(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - started
+        stack.pop()
+        with _spans_lock:
+            _spans.append(record)
+        if parent is None:
+            _export_run(record["run"])
+
+
+def timed(name=None):
+    """Decorator recording every call of the function as a span."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__) as record:
+                result = function(*args, **kwargs)
+                record["rows"] = row_count(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def cached(cache, name=None):
+    """
+    Decorator caching the function with `cache` (e.g. `st.cache_data`), timed as a span.
+
+    The span is marked as a cache miss when the function body runs and a hit otherwise.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def compute(*args, **kwargs):
+            _stack()[-1]["cache"] = "miss"
+            return function(*args, **kwargs)
+
+        cached_function = cache(compute)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__, cache="hit") as record:
+                result = cached_function(*args, **kwargs)
+                record["rows"] = row_count(result)
+            return result
+
+        wrapper.clear = cached_function.clear
+        return wrapper
+    return decorate
+
+
+def spans():
+    with _spans_lock:
+        return list(_spans)
+
+
+def spans_frame():
+    """Recorded spans, one row each, with `offset` seconds from the start of their run."""
+    frame = pd.DataFrame(spans(), columns=[
+        "run", "id", "parent", "depth", "name", "thread", "start", "duration", "rows", "cache"])
+    frame["offset"] = frame["start"] - frame.groupby("run")["start"].transform("min")
+    return frame
+
+
+def to_json_lines(records):
+    return "".join(json.dumps(record, default=str) + "\n" for record in records)
+
+
+def _export_run(run):
+    # Set TIMING_LOG_PATH to keep every run's spans for tracking latency over time
+    log_path = os.getenv("TIMING_LOG_PATH")
+    if not log_path:
+        return
+    records = [record for record in spans() if record["run"] == run]
+    with _spans_lock, open(log_path, "a") as log:
+        log.write(to_json_lines(records))
@@ -0,0 +1,94 @@
+import json
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import timing
+
+
+STORE_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    transactionId TEXT PRIMARY KEY,
+    accountId TEXT NOT NULL,
+    date TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (accountId, date);
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    accountId TEXT NOT NULL,
+    range_start TEXT NOT NULL,
+    range_end TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS synced_ranges_account ON synced_ranges (accountId);
+"""
+
+
+def format_timestamp(timestamp):
+    # Fixed width so that SQLite's text comparison orders timestamps correctly
+    return pd.Timestamp(timestamp).strftime(STORE_TIMESTAMP_FORMAT)
+
+
+def connect(store_path):
+    connection = sqlite3.connect(store_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def to_store_dates(dates: pd.Series):
+    """Normalise transaction timestamps to naive UTC so they compare as plain text."""
+    dates = pd.to_datetime(dates, utc=True).dt.tz_convert(None)
+    return dates.dt.strftime(STORE_TIMESTAMP_FORMAT)
+
+
+@timing.timed("transaction store upsert")
+def upsert_transactions(store_path, account_id, df: pd.DataFrame, id_column, date_column):
+    """Insert new transactions and overwrite edited ones, keyed by transaction ID."""
+    if df.empty:
+        return
+    rows = zip(
+        df[id_column].astype(str),
+        to_store_dates(df[date_column]),
+        (json.dumps(record, default=str) for record in df.to_dict("records")),
+    )
+    with closing(connect(store_path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO transactions (transactionId, accountId, date, record) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (transactionId) DO UPDATE SET "
+            "accountId = excluded.accountId, date = excluded.date, record = excluded.record",
+            ((transaction_id, account_id, date, record) for transaction_id, date, record in rows)
+        )
+
+
+def synced_ranges(store_path, account_id):
+    """The (start, end, synced_at) ranges already synced for an account, ordered by start."""
+    with closing(connect(store_path)) as connection:
+        rows = connection.execute(
+            "SELECT range_start, range_end, synced_at FROM synced_ranges WHERE accountId = ? "
+            "ORDER BY range_start",
+            (account_id,)
+        ).fetchall()
+    return [tuple(pd.Timestamp(value) for value in row) for row in rows]
+
+
+def set_synced_ranges(store_path, account_id, ranges):
+    with closing(connect(store_path)) as connection, connection:
+        connection.execute("DELETE FROM synced_ranges WHERE accountId = ?", (account_id,))
+        connection.executemany(
+            "INSERT INTO synced_ranges (accountId, range_start, range_end, synced_at) VALUES (?, ?, ?, ?)",
+            ((account_id, *(format_timestamp(value) for value in synced_range)) for synced_range in ranges)
+        )
+
+
+@timing.timed("transaction store query")
+def query_transactions(store_path, start_date, end_date, account_ids):
+    """Transactions for the accounts with start_date <= date < end_date, oldest first."""
+    placeholders = ", ".join("?" * len(account_ids))
+    with closing(connect(store_path)) as connection:
+        records = connection.execute(
+            f"SELECT record FROM transactions WHERE accountId IN ({placeholders}) "
+            "AND date >= ? AND date < ? ORDER BY date",
+            (*account_ids, format_timestamp(start_date), format_timestamp(end_date))
+        ).fetchall()
+    return pd.DataFrame.from_records([json.loads(record) for (record,) in records])
@@ -1,28 +1,94 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import os
-import altair as alt
 from streamlit.delta_generator import DeltaGenerator
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from io import StringIO
+from requests.adapters import HTTPAdapter
+import workbook_cache
+import workbook_reader
+import rollup
+import schema
+import derivations
+import watcher
+import journal
+from filter_index import FilterIndex
+import transaction_store
+import range_cache
+import reconcile
+import categoriser
+import memo
+import query_backend
+import chart_cache
+import report_snapshot
+import reports
+import timing
 
 
 SPENDING_SHEET_NAME = "Spending"
-SPENDING_DATA_SCHEMA = [
-    "Item",
-    "Cost",
-    "Quantity",
-    "Measure",
-    "Location",
-    "Shop",
-    "Details",
-    "Tag",
-    "Date",
-    "Receipt Ref",
-    "Receipt",
-    "transactionId"
-]
+SPENDING_ROW_ID = "Row ID"
+SPENDING_DATA_SCHEMA = {
+    "Item": "category",
+    "Cost": "float64",
+    "Quantity": "float64",
+    "Measure": "category",
+    "Location": "category",
+    "Shop": "category",
+    "Details": "string",
+    "Tag": "category",
+    "Date": "datetime64[ns]",
+    "Receipt Ref": "Int64",
+    "Receipt": "string",
+    "transactionId": "string",
+}
+# Columns joined on from the hierarchy and Location sheets
+SPENDING_JOINED_SCHEMA = {
+    "Sub Sub Category": "category",
+    "Sub Category": "category",
+    "Category": "category",
+    "Latitude": "float64",
+    "Longitude": "float64",
+}
+# Bump whenever _read_spending_workbook changes the frames it produces
+SPENDING_CACHE_VERSION = 4
+# The columns read of each sheet of the spending workbook
+SPENDING_SHEET_COLUMNS = {
+    SPENDING_SHEET_NAME: workbook_reader.only(SPENDING_DATA_SCHEMA),
+    "Top_Table": workbook_reader.only(["Sub Category", "Category"]),
+    "Middle Table": workbook_reader.only(["Sub Sub Category", "Sub Category"]),
+    "Base Table": workbook_reader.only(["All Items", "Sub Sub Category"]),
+    "Location": workbook_reader.only(["Location", "Latitude", "Longitude"]),
+}
+SPENDING_PARTITION_COLUMNS = {"spending": "Date", "rollup": "Date"}
+SPENDING_FILTER_COLUMNS = ["Tag", "Shop", "Category", "Sub Category"]
+INCOME_FILTER_COLUMNS = ["Employer", "Description", "Financial Year"]
+# Bytes of aggregation results kept between reruns, shared by every session
+AGGREGATION_MEMO_BUDGET = 256 * 1024 ** 2
+# Filters and groups the spending rows, see query_backend.BACKENDS
+QUERY_BACKEND = "pandas"
+
+TRANSACTIONS_URI = "http://localhost:8080"
+TRANSACTIONS_CSV_ENDPOINT = "/api/v1/transactions/csv"
+# The most transactions the API returns for one request
+TRANSACTIONS_PAGE_SIZE = 10000
+# (connect, read) seconds
+TRANSACTIONS_TIMEOUT = (3.05, 60)
+TRANSACTIONS_MAX_WORKERS = 4
+# Comma separated Up account IDs, overridden by the UP_ACCOUNT_IDS environment variable
+UP_ACCOUNT_IDS = "a90b55ad-1bcb-4e75-b407-0e0e1e5c8a6d"
+TRANSACTION_ID_COLUMN = "transactionId"
+TRANSACTION_DATE_COLUMN = "createdAt"
+TRANSACTION_AMOUNT_COLUMN = "amount"
+TRANSACTION_DESCRIPTION_COLUMN = "description"
+TRANSACTION_ACCOUNT_COLUMN = "accountId"
+# Next to this module rather than the working directory, which differs when run from cron
+TRANSACTION_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transactions.db")
+# Transactions this close to the time they were synced can still change (e.g. pending ones
+# settling), they are synced again once the sync is older than TRANSACTION_TAIL_TTL
+TRANSACTION_SYNC_OVERLAP = pd.DateOffset(days=7)
+TRANSACTION_TAIL_TTL = pd.Timedelta(minutes=15)
 
 
 def dataframe_in_list(df, key, list_items):
@@ -46,63 +112,252 @@ def calculate_financial_year(date):
         return f"FY {year - 1}/{year}"
 
 
-@st.cache_data
-def fetch_spending_data():
-    # Data ingest and basic prep hello
-    spending_excel_path = os.getenv("EXCEL_PATH_SPENDING")
-    spending_data = pd.read_excel(
-        spending_excel_path,
-        sheet_name=[SPENDING_SHEET_NAME, "Top_Table", "Middle Table", "Base Table", "Location"])
-    
-    df = remove_unnamed_columns(spending_data['Spending'])
-    top_table = remove_unnamed_columns(spending_data['Top_Table'])
-    middle_table = remove_unnamed_columns(spending_data['Middle Table'])
-    base_table = remove_unnamed_columns(spending_data['Base Table'])
-    location = remove_unnamed_columns(spending_data['Location'])
-    
-    hierarchy = (
-        base_table
-        .rename(columns={'All Items': 'Item'})
-        .merge(middle_table, on="Sub Sub Category")
-        .merge(top_table, on="Sub Category")
-    )
+def _join_spending(df, hierarchy, location):
+    # Row IDs are the rows' positions in the Spending sheet, kept as the index through the joins
     df = (
         df
+        .rename_axis(SPENDING_ROW_ID)
+        .reset_index()
         .merge(hierarchy, on='Item', how='left')
         .merge(location, on='Location', how='left')
+        .set_index(SPENDING_ROW_ID)
     )
-    df['Details'] = df['Details'].astype(str)
-    return df
+    return schema.apply_schema(df, {**SPENDING_DATA_SCHEMA, **SPENDING_JOINED_SCHEMA})
 
 
-@st.cache_data
-def fetch_income_deduction_data():
-    income_excel_path = os.getenv("EXCEL_PATH_INCOME")
-    income_sheets = pd.read_excel(
-        income_excel_path,
-        sheet_name=["Income", "Deductions"]
+def _read_spending_workbook(spending_excel_path):
+    with timing.span("read_excel spending") as record:
+        spending_data = workbook_reader.read_sheets(spending_excel_path, SPENDING_SHEET_COLUMNS)
+        record["rows"] = len(spending_data[SPENDING_SHEET_NAME])
+
+    df = spending_data['Spending']
+    top_table = spending_data['Top_Table']
+    middle_table = spending_data['Middle Table']
+    base_table = spending_data['Base Table']
+    location = spending_data['Location']
+    
+    with timing.span("join hierarchy and location", rows=len(df)):
+        hierarchy = (
+            base_table
+            .rename(columns={'All Items': 'Item'})
+            .merge(middle_table, on="Sub Sub Category")
+            .merge(top_table, on="Sub Category")
+        )
+        df, rejected = _join_spending(df, hierarchy, location)
+    with timing.span("build rollup") as record:
+        spending_rollup = rollup.build_spending_rollup(df)
+        record["rows"] = len(spending_rollup)
+    return {
+        "spending": df,
+        "rollup": spending_rollup,
+        "rejected": rejected,
+        "hierarchy": hierarchy,
+        "location": location,
+    }
+
+
+@timing.timed()
+def _apply_journal(name, frame, changes, hierarchy, location, date_range):
+    # Saved edits not yet compacted into the workbook, see save_data
+    columns = list(SPENDING_DATA_SCHEMA)
+    before, _ = _join_spending(journal.changes_frame(changes, 0, columns), hierarchy, location)
+    after, _ = _join_spending(journal.changes_frame(changes, 1, columns), hierarchy, location)
+    if date_range is not None:
+        before = workbook_cache.apply_date_range(before, "Date", date_range)
+        after = workbook_cache.apply_date_range(after, "Date", date_range)
+    if name == "rollup":
+        return rollup.apply_changes(frame, before, after)
+    return schema.concat([frame.drop(index=list(changes), errors="ignore"), after]).sort_index()
+
+
+def _load_spending_frame(name, start_date, end_date):
+    # Served from the columnar cache when the workbook is unchanged.
+    # A date range only reads the monthly partitions that overlap it.
+    spending_excel_path = os.getenv("EXCEL_PATH_SPENDING")
+    date_range = None if start_date is None and end_date is None else (start_date, end_date)
+    workbook_digest, frames = workbook_cache.load_versioned_frames(
+        spending_excel_path,
+        _read_spending_workbook,
+        SPENDING_PARTITION_COLUMNS,
+        date_range,
+        [name, "hierarchy", "location"],
+        SPENDING_CACHE_VERSION
     )
-    income_data = remove_unnamed_columns(income_sheets['Income'])
+    changes = journal.net_changes(spending_excel_path, workbook_digest)
+    frame = frames[name]
+    if changes and name in ("spending", "rollup"):
+        frame = _apply_journal(name, frame, changes, frames["hierarchy"], frames["location"], date_range)
+    # Edits made on the frame are saved against the version it was read from, see save_data
+    frame.attrs[journal.WORKBOOK_DIGEST] = workbook_digest
+    return frame
+
+
+@timing.cached(st.cache_data)
+def fetch_spending_data(start_date=None, end_date=None):
+    return _load_spending_frame("spending", start_date, end_date)
+
+
+@timing.cached(st.cache_data)
+def fetch_spending_rollup(start_date=None, end_date=None):
+    # Daily totals by every breakdown dimension, see rollup.build_spending_rollup
+    return _load_spending_frame("rollup", start_date, end_date)
+
+
+@timing.cached(st.cache_data)
+def fetch_spending_locations():
+    # The Location sheet, placing each location by its Latitude and Longitude
+    return _load_spending_frame("location", None, None)
+
+
+@timing.cached(st.cache_data)
+def fetch_rejected_spending_rows():
+    # Rows with values that did not match SPENDING_DATA_SCHEMA, as read from the sheet
+    return _load_spending_frame("rejected", None, None)
+
+
+@timing.cached(st.cache_data)
+def fetch_spending_date_bounds():
+    spending_excel_path = os.getenv("EXCEL_PATH_SPENDING")
+    minimum_date, maximum_date = workbook_cache.load_date_bounds(
+        spending_excel_path,
+        _read_spending_workbook,
+        SPENDING_PARTITION_COLUMNS,
+        "spending",
+        SPENDING_CACHE_VERSION
+    )
+    changes = journal.net_changes(spending_excel_path, workbook_cache.current_hash(spending_excel_path))
+    saved_dates = pd.to_datetime(
+        journal.changes_frame(changes, 1, list(SPENDING_DATA_SCHEMA))["Date"], errors="coerce").dropna()
+    if saved_dates.empty:
+        return minimum_date, maximum_date
+    return min(minimum_date, saved_dates.min()), max(maximum_date, saved_dates.max())
+
+
+@timing.cached(st.cache_resource(max_entries=8))
+def spending_filter_index(start_date=None, end_date=None):
+    return FilterIndex(fetch_spending_data(start_date, end_date), SPENDING_FILTER_COLUMNS, "Date")
+
+
+@timing.cached(st.cache_resource(max_entries=8))
+def spending_rollup_filter_index(start_date=None, end_date=None):
+    return FilterIndex(fetch_spending_rollup(start_date, end_date), SPENDING_FILTER_COLUMNS, "Date")
+
+
+@st.cache_resource
+def aggregation_memo():
+    return memo.AggregationMemo(AGGREGATION_MEMO_BUDGET)
+
+
+@st.cache_resource
+def data_backend():
+    return query_backend.create(os.getenv("QUERY_BACKEND", QUERY_BACKEND))
+
+
+def memoized(key, spec, compute):
+    """
+    `compute()`, reused by every rerun and session asking for the same `spec`, e.g.
+    ("by year", "Gross Income"), under the same `key` from `select_memoized`.
+    """
+    return aggregation_memo().get((*key, spec), compute)
+
+
+def select_memoized(index: FilterIndex, selections=None, start_date=None, end_date=None):
+    """
+    The rows of `index` matching the filter, and the key their aggregations are memoized
+    under. The key changes with the dataset version and the filter, nothing else.
+    """
+    key = (index.version, memo.normalise_filters(selections, start_date, end_date))
+    query = query_backend.Query(index, selections, start_date, end_date)
+    return key, memoized(key, "rows", lambda: data_backend().select(query))
+
+
+def _clear_spending_data():
+    fetch_spending_data.clear()
+    fetch_spending_rollup.clear()
+    fetch_spending_date_bounds.clear()
+    fetch_rejected_spending_rows.clear()
+    fetch_spending_locations.clear()
+    spending_filter_index.clear()
+    spending_rollup_filter_index.clear()
+
+
+def _read_income_workbook(income_excel_path):
+    with timing.span("read_excel income") as record:
+        # Every named column, the income table shows them all
+        income_sheets = workbook_reader.read_sheets(
+            income_excel_path,
+            {"Income": workbook_reader.named_columns, "Deductions": workbook_reader.named_columns}
+        )
+        record["rows"] = len(income_sheets["Income"])
+    income_data = income_sheets['Income']
     income_data[["Salary Sacrifice", "Tax"]] = income_data[["Salary Sacrifice", "Tax"]].fillna(0)
-    income_data["Financial Year"] = pd.to_datetime(income_data['Date']).apply(calculate_financial_year)
-    income_data['Taxable Income'] = income_data.apply(
-        lambda row: (
-            row['Gross Income'] - row['Salary Sacrifice']
-            if row['Taxable'] == 1 else
-            row['Gross Income'] + row['Tax'])
-        if row['Taxable'] == 2
-        else 0,
-        axis=1
+    income_data["Financial Year"] = derivations.financial_year(income_data['Date'])
+    income_data['Taxable Income'] = derivations.taxable_income(income_data)
+
+    deduction_data = income_sheets['Deductions']
+    deduction_data["Financial Year"] = derivations.financial_year(deduction_data['Date'])
+    return {"income": income_data, "deductions": deduction_data}
+
+
+@timing.cached(st.cache_data)
+def fetch_income_deduction_data():
+    income_excel_path = os.getenv("EXCEL_PATH_INCOME")
+    frames = workbook_cache.load_frames(income_excel_path, _read_income_workbook)
+    return frames["income"], frames["deductions"]
+
+
+@timing.cached(st.cache_resource)
+def income_filter_index():
+    income_data, _ = fetch_income_deduction_data()
+    return FilterIndex(income_data, INCOME_FILTER_COLUMNS, "Date")
+
+
+def _clear_income_data():
+    fetch_income_deduction_data.clear()
+    income_filter_index.clear()
+
+
+def _rebuild_spending_data():
+    # The new version is fully cached before the loaders are cleared, until then they keep
+    # serving the previous one
+    workbook_cache.refresh(
+        os.getenv("EXCEL_PATH_SPENDING"),
+        _read_spending_workbook,
+        SPENDING_PARTITION_COLUMNS,
+        SPENDING_CACHE_VERSION
     )
+    _clear_spending_data()
+
+
+def _rebuild_income_data():
+    workbook_cache.refresh(os.getenv("EXCEL_PATH_INCOME"), _read_income_workbook)
+    _clear_income_data()
+
 
-    deduction_data = remove_unnamed_columns(income_sheets['Deductions'])
-    deduction_data["Financial Year"] = pd.to_datetime(deduction_data['Date']).apply(calculate_financial_year)
-    return income_data, deduction_data
+@st.cache_resource
+def workbook_watcher():
+    # One watcher per server process, shared by every session
+    workbook_watcher = watcher.WorkbookWatcher()
+    workbook_watcher.watch(os.getenv("EXCEL_PATH_SPENDING"), _rebuild_spending_data)
+    workbook_watcher.watch(os.getenv("EXCEL_PATH_INCOME"), _rebuild_income_data)
+    workbook_watcher.start()
+    return workbook_watcher
+
+
+def refresh_spending_data():
+    # Only reloads when the workbook changed since the watcher last saw it
+    workbook_watcher().check(os.getenv("EXCEL_PATH_SPENDING"))
+
+
+def refresh_income_data():
+    workbook_watcher().check(os.getenv("EXCEL_PATH_INCOME"))
 
 
 def date_sidebar(st: DeltaGenerator, df: pd.DataFrame, date_key: str, start_at_minimum=False):
-    minimum_date = df[date_key].min()
-    maximum_date = df[date_key].max()
+    return date_range_sidebar(st, df[date_key].min(), df[date_key].max(), start_at_minimum)
+
+
+def date_range_sidebar(st: DeltaGenerator, minimum_date, maximum_date, start_at_minimum=False):
     start_date_initial_value = maximum_date - pd.DateOffset(months=1)
     if start_at_minimum:
         start_date_initial_value = minimum_date
@@ -120,43 +375,116 @@ def date_sidebar(st: DeltaGenerator, df: pd.DataFrame, date_key: str, start_at_m
     return start_date, end_date
 
 
-def plot_bar_chart(dataframe, x_column, y_column, title, max_items=20):
-    """Helper function to generate a bar chart with custom axis formatting."""
-    chart_data = (
-        dataframe.groupby(x_column)[y_column]
-        .sum()
-        .reset_index()
-        .sort_values(by=y_column, ascending=False)
-        .head(max_items)
-    )
-    select = alt.selection_point(name="select", on="click")
-    highlight = alt.selection_point(name="highlight", on="pointerover", empty=False)
-    stroke_width = (
-        alt.when(select).then(alt.value(2, empty=False))
-        .when(highlight).then(alt.value(1))
-        .otherwise(alt.value(0))
-    )
-    return (
-        alt.Chart(chart_data)
-        .mark_bar()
-        .encode(
-            x=alt.X(
-                x_column,
-                sort=None,
-                title=title,
-                axis=alt.Axis(labelAngle=-30, labelOverlap=False),
-            ),
-            y=alt.Y(
-                y_column,
-                title="Total Cost",
-                axis=alt.Axis(labelExpr='"$" + datum.value'),
-            ),
-            fillOpacity=alt.when(select).then(alt.value(1)).otherwise(alt.value(0.3)),
-            strokeWidth=stroke_width,
-        ).configure_scale(bandPaddingInner=0.2).add_params(select, highlight)
-    )
+def snapshot_sources(names=("spending", "income", "transactions")):
+    """Versions of the data report snapshots are computed from, see `report_snapshot`."""
+    sources = {}
+    for name in names:
+        if name == "transactions":
+            sources[name] = report_snapshot.file_version(
+                os.getenv("TRANSACTION_STORE_PATH", TRANSACTION_STORE_PATH))
+            continue
+        workbook_path = os.getenv("EXCEL_PATH_SPENDING" if name == "spending" else "EXCEL_PATH_INCOME")
+        digest = workbook_cache.current_hash(workbook_path)
+        # Saved edits change the data without changing the workbook
+        sources[name] = [digest, report_snapshot.file_version(journal.journal_path(workbook_path, digest))]
+    return sources
+
+
+@timing.cached(st.cache_resource(max_entries=2))
+def _load_report_snapshot(manifest):
+    return report_snapshot.load(manifest)
+
+
+def from_snapshot(source, scope, name, compute):
+    """
+    The `name` aggregate for `scope` from today's report snapshot, when it was computed
+    from the `source` data as it is now, otherwise `compute()`. A None scope, an ad-hoc
+    filter, is always computed.
+    """
+    if scope is None:
+        return compute()
+    manifest = report_snapshot.read_manifest()
+    if not report_snapshot.is_current(manifest, snapshot_sources([source]), pd.Timestamp.today()):
+        return compute()
+    frames = _load_report_snapshot(manifest).get(name, {})
+    return frames[scope] if scope in frames else compute()
+
+
+@st.cache_resource
+def chart_specs():
+    return chart_cache.ChartCache()
+
+
+def altair_chart(st: DeltaGenerator, key, data: pd.DataFrame, build, use_container_width=True):
+    """
+    Draw the Altair chart `build(data)` makes. Its spec is built once per `key`, which must
+    cover whatever else the chart depends on, and `data` is only serialised when it changed.
+    """
+    st.vega_lite_chart(
+        spec=chart_specs().vega_lite_spec(key, data, build), use_container_width=use_container_width)
+
+
+def plotly_chart(st: DeltaGenerator, key, data: pd.DataFrame, build, use_container_width=True):
+    """Draw the Plotly figure `build(data)` makes, built again only when `data` changed."""
+    st.plotly_chart(chart_specs().figure(key, data, build), use_container_width=use_container_width)
 
 
+@timing.timed()
+def plot_bar_chart(st: DeltaGenerator, dataframe, x_column, y_column, title, max_items=20, memo_key=None,
+                   scope=None, query=None):
+    """
+    Helper function to draw a bar chart with custom axis formatting.
+
+    With the `memo_key` of `dataframe` from `select_memoized`, the totals are memoized, with
+    the spending `scope` of `report_snapshot.scope` they come from the report snapshot. With
+    the `query` `dataframe` was selected by, the data backend groups its rows.
+    """
+    import altair as alt
+
+    def compute_totals():
+        if query is None:
+            return reports.top_totals(dataframe, x_column, y_column, max_items)
+        return data_backend().top_totals(query, x_column, y_column, max_items)
+
+    def top_totals():
+        if memo_key is None:
+            return compute_totals()
+        return memoized(memo_key, ("top", x_column, y_column, max_items), compute_totals)
+
+    chart_data = from_snapshot("spending", scope, f"top {max_items} {x_column} by {y_column}", top_totals)
+
+    def bar_chart(data):
+        select = alt.selection_point(name="select", on="click")
+        highlight = alt.selection_point(name="highlight", on="pointerover", empty=False)
+        stroke_width = (
+            alt.when(select).then(alt.value(2, empty=False))
+            .when(highlight).then(alt.value(1))
+            .otherwise(alt.value(0))
+        )
+        return (
+            alt.Chart(data)
+            .mark_bar()
+            .encode(
+                x=alt.X(
+                    x_column,
+                    sort=None,
+                    title=title,
+                    axis=alt.Axis(labelAngle=-30, labelOverlap=False),
+                ),
+                y=alt.Y(
+                    y_column,
+                    title="Total Cost",
+                    axis=alt.Axis(labelExpr='"$" + datum.value'),
+                ),
+                fillOpacity=alt.when(select).then(alt.value(1)).otherwise(alt.value(0.3)),
+                strokeWidth=stroke_width,
+            ).configure_scale(bandPaddingInner=0.2).add_params(select, highlight)
+        )
+
+    altair_chart(st, ("bar chart", x_column, y_column, title), chart_data, bar_chart)
+
+
+@timing.timed()
 def format_income_table(dataframe: pd.DataFrame, column_names=[
         "Gross Income",
         "Salary Sacrifice",
@@ -164,51 +492,437 @@ def format_income_table(dataframe: pd.DataFrame, column_names=[
         "Income",
         "Tax"]):
     dataframe_formatted = dataframe.style.format(
-            {columnname: '${:,.2f}' for columnname in column_names}
+            {columnname: '${:,.2f}' for columnname in column_names if columnname in dataframe.columns}
         )
     return dataframe_formatted
 
 
-# Fetch the data from Upbank Client as a csv then read into a dataframe
-@st.cache_data
-def fetch_transaction_data(start_date=pd.Timestamp.today() - pd.DateOffset(months=1), end_date=pd.Timestamp.today()):
-    transactions_uri = "http://localhost:8080"
-    csv_endpoint = "/api/v1/transactions/csv"
+TABLE_PAGE_SIZE = 50
+
+
+def _sorted_positions(column: pd.Series, ascending):
+    # Only the sort column is sorted, the table's rows are taken once the page is known
+    return (
+        column.reset_index(drop=True)
+        .sort_values(ascending=ascending, kind="stable", na_position="last")
+        .index.to_numpy()
+    )
+
+
+@timing.timed()
+def paged_table(st: DeltaGenerator, dataframe: pd.DataFrame, key, format=None, page_size=TABLE_PAGE_SIZE,
+                **kwargs):
+    """
+    A table of one page of `dataframe` at a time, with controls for the sort, the columns
+    shown and the page.
+
+    The rows are sorted and sliced before anything is copied, so only the page's rows of the
+    chosen columns are passed to `format`, e.g. `format_income_table`, and sent.
+    """
+    controls = st.container()
+    sort_col, order_col, columns_col, page_col = controls.columns([2, 1, 3, 1])
+    sort_column = sort_col.selectbox("Sort by", options=list(dataframe.columns), index=None, key=f"{key}_sort")
+    ascending = order_col.radio("Order", options=["Ascending", "Descending"], key=f"{key}_order") == "Ascending"
+    columns = columns_col.multiselect("Columns", options=list(dataframe.columns), key=f"{key}_columns")
+    page_count = max(1, -(-len(dataframe) // page_size))
+    page = page_col.number_input("Page", min_value=1, max_value=page_count, key=f"{key}_page")
+
+    first = (page - 1) * page_size
+    if sort_column is None:
+        positions = np.arange(first, min(first + page_size, len(dataframe)))
+    else:
+        positions = _sorted_positions(dataframe[sort_column], ascending)[first:first + page_size]
+    column_positions = dataframe.columns.get_indexer(columns) if columns else slice(None)
+    page_rows = dataframe.iloc[positions, column_positions]
+
+    st.dataframe(page_rows if format is None else format(page_rows), **kwargs)
+    st.caption(f"Rows {first + 1 if len(page_rows) else 0:,}-{first + len(page_rows):,} of {len(dataframe):,}")
+
+
+@st.cache_resource
+def transactions_session():
+    # Keeps connections to the Up bank client open between requests and reruns
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TRANSACTIONS_MAX_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def transactions_executor():
+    # Every account's shard requests share it, so no more run at once than the session
+    # keeps connections for
+    return ThreadPoolExecutor(max_workers=TRANSACTIONS_MAX_WORKERS, thread_name_prefix="transactions")
+
+
+@timing.timed("transactions request")
+def _request_transactions(session, start_date, end_date, account_id):
     params = {
-        "startDate": f"{start_date}T00:00:00.000Z",
-        "endDate": f"{end_date}T00:00:00.000Z",
-        "numTransactions": 10000,
-        "accountId": "a90b55ad-1bcb-4e75-b407-0e0e1e5c8a6d",
+        "startDate": f"{pd.Timestamp(start_date):%Y-%m-%dT%H:%M:%S.000Z}",
+        "endDate": f"{pd.Timestamp(end_date):%Y-%m-%dT%H:%M:%S.000Z}",
+        "numTransactions": TRANSACTIONS_PAGE_SIZE,
+        "accountId": account_id,
         "transactionTypes": ['Payment', 'Purchase', 'Refund']
     }
-    try:
-        # Fetch the CSV data
-        response = requests.get(transactions_uri + csv_endpoint, params=params)
+    with session.get(
+            TRANSACTIONS_URI + TRANSACTIONS_CSV_ENDPOINT,
+            params=params,
+            timeout=TRANSACTIONS_TIMEOUT,
+            stream=True) as response:
         response.raise_for_status()  # Raise an exception for HTTP errors
+        # Parse the CSV straight from the socket, undoing any gzip/deflate on the way
+        response.raw.decode_content = True
+        try:
+            return pd.read_csv(response.raw)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
 
-        # Convert CSV response to a pandas DataFrame
-        csv_data = response.content.decode("utf-8")
-        dataframe = pd.read_csv(StringIO(csv_data))
-        return dataframe
 
-    except requests.exceptions.RequestException as e:
-        st.error(f"Please check that the service is running successfully at {transactions_uri}.\n\n An error occurred while fetching the data: {e}")
+def _fetch_transaction_shard(session, start_date, end_date, account_id):
+    transactions = _request_transactions(session, start_date, end_date, account_id)
+    if len(transactions) < TRANSACTIONS_PAGE_SIZE or end_date - start_date <= pd.Timedelta(seconds=2):
+        return transactions
+    # A full page means the API stopped at the cap, fetch each half separately instead
+    middle_date = (start_date + (end_date - start_date) / 2).floor("s")
+    return pd.concat([
+        _fetch_transaction_shard(session, start_date, middle_date, account_id),
+        _fetch_transaction_shard(session, middle_date, end_date, account_id),
+    ], ignore_index=True)
+
+
+def fetch_transactions(start_date, end_date, account_id):
+    """
+    Transactions in [start_date, end_date) from the Up bank client.
+
+    The window is split into calendar month shards that are fetched concurrently on
+    transactions_executor, shards that come back truncated at TRANSACTIONS_PAGE_SIZE are
+    split again.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    month_starts = pd.date_range(start_date.normalize(), end_date, freq="MS")
+    edges = [start_date, *(date for date in month_starts if start_date < date < end_date), end_date]
+    session = transactions_session()
+    parent_span = timing.current()
+
+    def fetch_shard(shard):
+        with timing.span("transactions shard", parent=parent_span) as record:
+            transactions = _fetch_transaction_shard(session, *shard, account_id)
+            record["rows"] = len(transactions)
+        return transactions
+
+    shards = [
+        frame for frame in transactions_executor().map(fetch_shard, zip(edges, edges[1:]))
+        if not frame.empty
+    ]
+    if not shards:
         return pd.DataFrame()
+    # Transactions on a shard boundary can be returned by both shards
+    return pd.concat(shards, ignore_index=True).drop_duplicates(TRANSACTION_ID_COLUMN, ignore_index=True)
+
+
+@timing.timed()
+def _fresh_ranges(synced_ranges, now):
+    fresh_ranges = []
+    for start, end, synced_at in synced_ranges:
+        if now - synced_at < TRANSACTION_TAIL_TTL:
+            # A recent sync up to the time it ran covers everything up to now
+            end = max(end, now) if end >= synced_at else end
+        else:
+            end = min(end, synced_at - TRANSACTION_SYNC_OVERLAP)
+        if start < end:
+            fresh_ranges.append((start, end))
+    return fresh_ranges
+
+
+def sync_transactions(start_date, end_date, account_id, now):
+    """
+    Bring the local transaction store up to date for [start_date, end_date).
+
+    Only the gaps between the ranges already synced are requested, along with the
+    TRANSACTION_SYNC_OVERLAP before a sync once it is older than TRANSACTION_TAIL_TTL.
+    Returns whether anything was requested.
+    """
+    store_path = os.getenv("TRANSACTION_STORE_PATH", TRANSACTION_STORE_PATH)
+    synced_ranges = transaction_store.synced_ranges(store_path, account_id)
+    missing = range_cache.missing_ranges(_fresh_ranges(synced_ranges, now), start_date, end_date)
+    for window_start, window_end in missing:
+        transactions = fetch_transactions(window_start, window_end, account_id)
+        transaction_store.upsert_transactions(
+            store_path, account_id, transactions, TRANSACTION_ID_COLUMN, TRANSACTION_DATE_COLUMN)
+        # The window was synced now, whatever the ranges it re-synced said
+        synced_ranges = range_cache.overlay_range(synced_ranges, window_start, window_end, now)
+        transaction_store.set_synced_ranges(store_path, account_id, synced_ranges)
+    return bool(missing)
+
+
+def _query_transactions(account_id, start_date, end_date):
+    store_path = os.getenv("TRANSACTION_STORE_PATH", TRANSACTION_STORE_PATH)
+    return transaction_store.query_transactions(store_path, start_date, end_date, [account_id])
+
+
+@st.cache_resource
+def transaction_cache():
+    # Transactions read from the store, sub-ranges of what is held are sliced from memory
+    return range_cache.RangeCache(
+        _query_transactions,
+        lambda df: pd.to_datetime(df[TRANSACTION_DATE_COLUMN], utc=True).dt.tz_convert(None))
+
+
+def transaction_account_ids():
+    return [
+        account_id.strip()
+        for account_id in os.getenv("UP_ACCOUNT_IDS", UP_ACCOUNT_IDS).split(",")
+        if account_id.strip()
+    ]
+
+
+def empty_transactions():
+    # The columns fetched transactions have, for when there are none
+    return pd.DataFrame({
+        TRANSACTION_ID_COLUMN: pd.Series(dtype="str"),
+        TRANSACTION_DATE_COLUMN: pd.Series(dtype="str"),
+        TRANSACTION_DESCRIPTION_COLUMN: pd.Series(dtype="str"),
+        TRANSACTION_AMOUNT_COLUMN: pd.Series(dtype="float64"),
+        TRANSACTION_ACCOUNT_COLUMN: pd.Series(dtype="str"),
+    })
+
+
+def _fetch_account_transactions(cache, account_id, start_date, end_date, now):
+    # Returns (transactions, error message) so errors are shown from the script thread
+    try:
+        if sync_transactions(start_date, end_date, account_id, now):
+            cache.discard(account_id)
+    except requests.exceptions.RequestException as e:
+        # Whatever has been synced so far is still served when the service is unavailable
+        return _query_transactions(account_id, start_date, end_date), (
+            f"Please check that the service is running successfully at {TRANSACTIONS_URI}.\n\n "
+            f"An error occurred while fetching the data: {e}")
     except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        return pd.DataFrame()
+        return _query_transactions(account_id, start_date, end_date), f"An unexpected error occurred: {e}"
+    return cache.get(account_id, start_date, end_date), None
 
 
-def save_data(df: pd.DataFrame):
-    with pd.ExcelWriter(
-        os.getenv("EXCEL_PATH_SPENDING"),
-        mode='a',
-        if_sheet_exists='replace',
-        engine='openpyxl',
-        date_format="YYYY-MM-DD",
-        datetime_format="YYYY-MM-DD"
-    ) as writer:
-        df.to_excel(
-            writer,
-            sheet_name=SPENDING_SHEET_NAME,
-        )
\ No newline at end of file
+def drop_internal_transfers(transactions: pd.DataFrame, dates: pd.Series = None):
+    """
+    Transactions without the receiving side of transfers between the accounts in the frame.
+
+    A transfer shows up in both accounts, as an amount leaving one and the same amount
+    arriving in the other at the same time, only the leaving side is kept. `dates` are the
+    transactions' parsed times, when the caller already has them.
+    """
+    if (
+        TRANSACTION_AMOUNT_COLUMN not in transactions
+        or transactions[TRANSACTION_ACCOUNT_COLUMN].nunique() < 2
+    ):
+        return transactions
+    cents = (pd.to_numeric(transactions[TRANSACTION_AMOUNT_COLUMN], errors="coerce") * 100).round()
+    keys = pd.DataFrame({
+        "date": pd.to_datetime(transactions[TRANSACTION_DATE_COLUMN], utc=True) if dates is None else dates,
+        "cents": cents.abs(),
+        "account": transactions[TRANSACTION_ACCOUNT_COLUMN],
+    })
+    sent = keys.loc[cents < 0]
+    received = keys.loc[cents > 0]
+    # The nth transfer of an amount at a time on one side pairs with the nth on the other
+    pairs = (
+        received.assign(nth=received.groupby(["date", "cents"]).cumcount())
+        .reset_index()
+        .merge(sent.assign(nth=sent.groupby(["date", "cents"]).cumcount()), on=["date", "cents", "nth"],
+               suffixes=("", " sent"))
+        .loc[lambda df: df["account"] != df["account sent"]]
+    )
+    return transactions.drop(index=pairs["index"])
+
+
+# Sync the data from Upbank Client into the local store then read the window from it
+@timing.timed()
+def fetch_transaction_data(start_date=None, end_date=None, account_ids=None):
+    """
+    Transactions in [start_date, end_date), by default the month up to now, oldest first.
+
+    Every account in `account_ids`, by default transaction_account_ids(), is synced
+    concurrently and the accounts are merged with an accountId column.
+    """
+    account_ids = account_ids or transaction_account_ids()
+    if not account_ids:
+        return empty_transactions()
+    now = pd.Timestamp.today()
+    end_date = now if end_date is None else pd.Timestamp(end_date)
+    start_date = end_date - pd.DateOffset(months=1) if start_date is None else pd.Timestamp(start_date)
+    cache = transaction_cache()
+    parent_span = timing.current()
+
+    def fetch_account(account_id):
+        with timing.span("account transactions", parent=parent_span) as record:
+            transactions, error = _fetch_account_transactions(cache, account_id, start_date, end_date, now)
+            record["rows"] = len(transactions)
+        return transactions.assign(**{TRANSACTION_ACCOUNT_COLUMN: account_id}), error
+
+    # The account threads only wait on the store and on their shards, whose requests are
+    # bounded by transactions_executor however many accounts there are
+    with ThreadPoolExecutor(max_workers=len(account_ids), thread_name_prefix="accounts") as pool:
+        results = list(pool.map(fetch_account, account_ids))
+    for error in dict.fromkeys(error for _, error in results if error):
+        st.error(error)
+    accounts = [transactions for transactions, _ in results if not transactions.empty]
+    if not accounts:
+        return empty_transactions()
+    transactions = pd.concat(accounts, ignore_index=True)
+    dates = pd.to_datetime(transactions[TRANSACTION_DATE_COLUMN], utc=True)
+    order = np.argsort(dates.to_numpy(), kind="stable")
+    transactions = drop_internal_transfers(transactions.take(order), dates.take(order))
+    return transactions.reset_index(drop=True)
+
+
+def _reconciliation_transactions(start_date, end_date, account_ids=None):
+    # Card payments can settle a few days either side of the receipt
+    transactions = fetch_transaction_data(
+        start_date - reconcile.DATE_TOLERANCE,
+        end_date + pd.Timedelta(days=1) + reconcile.DATE_TOLERANCE,
+        account_ids)
+    if transactions.empty:
+        return empty_transactions()
+    return transactions
+
+
+@timing.timed()
+def fetch_reconciliation(start_date, end_date, account_ids=None):
+    """
+    (matched, unmatched_bank, unmatched_spending) for the spending between the dates
+    inclusive, see reconcile.reconcile.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    return reconcile.reconcile(
+        fetch_spending_data(start_date, end_date),
+        _reconciliation_transactions(start_date, end_date, account_ids),
+        TRANSACTION_ID_COLUMN,
+        TRANSACTION_DATE_COLUMN,
+        TRANSACTION_AMOUNT_COLUMN)
+
+
+# The index categoriser_index built, None until a page first needs it. save_data updates it
+# through this rather than building it, which would sync the whole history from the bank
+_built_categoriser_index = None
+
+
+@timing.cached(st.cache_resource)
+def categoriser_index():
+    # Built once from the whole history, save_data then adds the rows it saves
+    global _built_categoriser_index
+    spending = fetch_spending_data()
+    minimum_date, maximum_date = fetch_spending_date_bounds()
+    transactions = _reconciliation_transactions(minimum_date, maximum_date)
+    matched, _, _ = reconcile.reconcile(
+        spending, transactions, TRANSACTION_ID_COLUMN, TRANSACTION_DATE_COLUMN, TRANSACTION_AMOUNT_COLUMN)
+    descriptions = (
+        matched.merge(transactions[[TRANSACTION_ID_COLUMN, TRANSACTION_DESCRIPTION_COLUMN]], on=TRANSACTION_ID_COLUMN)
+        .set_index("Row ID")[TRANSACTION_DESCRIPTION_COLUMN]
+    )
+    _built_categoriser_index = categoriser.build_index(spending, descriptions)
+    return _built_categoriser_index
+
+
+@timing.timed()
+def categorise_transactions(transactions: pd.DataFrame):
+    """
+    New Spending rows for the debits among `transactions`, labelled with the Shop, Item, Tag
+    and Location most often chosen for their merchant, and the Confidence of that choice.
+    The bank description is kept in Details.
+    """
+    debits = transactions.loc[pd.to_numeric(transactions[TRANSACTION_AMOUNT_COLUMN], errors="coerce") < 0]
+    labels = categoriser_index().label(debits[TRANSACTION_DESCRIPTION_COLUMN])
+    return pd.DataFrame({
+        "Item": labels["Item"],
+        "Cost": -pd.to_numeric(debits[TRANSACTION_AMOUNT_COLUMN]),
+        "Quantity": 1.0,
+        "Measure": pd.NA,
+        "Location": labels["Location"],
+        "Shop": labels["Shop"],
+        "Details": debits[TRANSACTION_DESCRIPTION_COLUMN],
+        "Tag": labels["Tag"],
+        "Date": pd.to_datetime(debits[TRANSACTION_DATE_COLUMN], utc=True)
+        .dt.tz_convert(reconcile.LOCAL_TIMEZONE).dt.tz_localize(None).dt.normalize(),
+        "Receipt Ref": pd.NA,
+        "Receipt": pd.NA,
+        "transactionId": debits[TRANSACTION_ID_COLUMN],
+        "Confidence": labels["Confidence"],
+    }).reset_index(drop=True)
+
+
+def save_categorised_transactions(rows: pd.DataFrame):
+    """Add rows from categorise_transactions to the spending, teaching the categoriser their labels."""
+    columns = list(SPENDING_DATA_SCHEMA)
+    save_data(rows[columns], rows.iloc[:0][columns], descriptions=rows["Details"])
+
+
+def account_sidebar(st: DeltaGenerator, transactions: pd.DataFrame):
+    """Sidebar filter of the transactions by account, all of them when none are selected."""
+    selected_accounts = st.sidebar.multiselect("Account", options=transaction_account_ids())
+    if not selected_accounts or transactions.empty:
+        return transactions
+    return transactions.loc[transactions[TRANSACTION_ACCOUNT_COLUMN].isin(selected_accounts)]
+
+
+def save_data(df: pd.DataFrame, snapshot: pd.DataFrame = None, descriptions: pd.Series = None):
+    """
+    Save edited spending line items.
+
+    Only the rows that differ from `snapshot`, the frame the edits were made on (everything
+    fetch_spending_data returns by default), are written. Rows are matched on their Row ID
+    index and rows without one are inserted. The changes go to a journal that is compacted
+    into the Spending sheet in the background, so a save does not rewrite the sheet.
+    Raises journal.StaleSnapshotError when `snapshot` was read from a workbook version that
+    has since been replaced, as its Row IDs may no longer match; inserts are saved anyway.
+
+    The saved rows' labels are counted by the categoriser in place of their previous ones,
+    by Shop and by the bank `descriptions` of the rows they are given for (indexed like `df`).
+    """
+    spending_excel_path = os.getenv("EXCEL_PATH_SPENDING")
+    all_rows = fetch_spending_data()
+    snapshot = all_rows if snapshot is None else snapshot
+    inserted, updated, deleted = journal.diff(snapshot, df, list(SPENDING_DATA_SCHEMA))
+    if inserted.empty and updated.empty and deleted.empty:
+        return
+
+    def append(all_rows):
+        # Inserted rows refer to no Row ID, only the IDs given out need the current version
+        version = all_rows if updated.empty and deleted.empty else snapshot
+        return journal.append(
+            spending_excel_path,
+            version.attrs.get(journal.WORKBOOK_DIGEST, all_rows.attrs[journal.WORKBOOK_DIGEST]),
+            snapshot,
+            inserted,
+            updated,
+            deleted,
+            next_row_id=int(all_rows.index.max()) + 1 if len(all_rows) else 0
+        )
+
+    try:
+        inserted_ids = append(all_rows)
+    except journal.StaleSnapshotError:
+        if not (updated.empty and deleted.empty):
+            raise
+        # Compacted since the rows were loaded, the inserts go on top of the new version
+        _clear_spending_data()
+        inserted_ids = append(fetch_spending_data())
+    # An index not built yet will be built from the saved rows too
+    index = _built_categoriser_index
+    if index is not None:
+        saved = pd.concat([inserted, updated])
+        # Counted by Row ID, so an edited row replaces what it was counted as before
+        row_ids = inserted_ids.append(updated.index)
+        index.remove(deleted.index)
+        index.relabel(updated)
+        index.update(saved["Shop"].set_axis(row_ids), saved.set_axis(row_ids))
+        if descriptions is not None:
+            is_described = saved.index.isin(descriptions.index)
+            described = descriptions.loc[saved.index[is_described]].set_axis(row_ids[is_described])
+            index.update(described, saved.set_axis(row_ids).loc[described.index], source="description")
+    _clear_spending_data()
+    journal.schedule_compaction(spending_excel_path, compact_spending_journal)
+
+
+def compact_spending_journal():
+    journal.compact(os.getenv("EXCEL_PATH_SPENDING"), SPENDING_SHEET_NAME, SPENDING_DATA_SCHEMA)
+    # The workbook watcher picks up the rewritten workbook and reloads it
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+import workbook_cache
+
+
+POLL_INTERVAL_SECONDS = 5
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WorkbookWatcher:
+    """
+    Polls workbooks in a background thread and calls their `on_change` when the content changes.
+
+    A file whose mtime moves without its content changing (e.g. saved again unedited) is
+    ignored, so the loaders are only invalidated when there is something new to load.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL_SECONDS):
+        self.poll_interval = poll_interval
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="workbook-watcher", daemon=True)
+
+    def watch(self, path, on_change):
+        if not path:
+            return
+        manifest = workbook_cache.read_manifest(path)
+        digest = manifest["hash"] if manifest and workbook_cache.is_current(path, manifest) else None
+        self.watched[path] = [_signature(path), digest, on_change]
+
+    def start(self):
+        self.thread.start()
+
+    def check(self, path):
+        """Call `on_change` if the workbook changed since it was last seen, returns whether it did."""
+        if path not in self.watched:
+            return False
+        with self.lock:
+            signature = _signature(path)
+            entry = self.watched[path]
+            if signature is None or signature == entry[0]:
+                return False
+            digest = workbook_cache.workbook_hash(path)
+            if digest != entry[1]:
+                entry[2]()
+            # Only recorded once on_change succeeded, so a failed rebuild is retried
+            changed = digest != entry[1]
+            entry[0], entry[1] = signature, digest
+            return changed
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            for path in list(self.watched):
+                try:
+                    self.check(path)
+                except Exception:
+                    # e.g. a half-written workbook failing to parse, retried on the next poll
+                    continue
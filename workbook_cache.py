@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+import pandas as pd
+import timing
+
+try:
+    import pyarrow
+except ImportError:  # The cache is optional, loaders fall back to parsing the workbook
+    pyarrow = None
+
+
+CACHE_DIR_SUFFIX = ".cache"
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_SIZE = 1 << 20
+UNDATED_PARTITION = "undated"
+
+# One build at a time per workbook, so concurrent loaders never parse it twice
+_build_locks = defaultdict(threading.Lock)
+
+
+def cache_dir(workbook_path):
+    """Cache directory kept next to the workbook, e.g. `.spending.xlsx.cache`."""
+    head, tail = os.path.split(os.path.abspath(workbook_path))
+    return os.path.join(head, f".{tail}{CACHE_DIR_SUFFIX}")
+
+
+@timing.timed("hash workbook")
+def workbook_hash(workbook_path):
+    digest = hashlib.sha256()
+    with open(workbook_path, "rb") as workbook:
+        for chunk in iter(lambda: workbook.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(workbook_path):
+    try:
+        with open(os.path.join(cache_dir(workbook_path), MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(directory, manifest):
+    # Written to a temporary file then swapped in so readers never see a partial manifest
+    temporary_path = os.path.join(directory, f"{MANIFEST_NAME}.tmp")
+    with open(temporary_path, "w") as temporary:
+        json.dump(manifest, temporary)
+    os.replace(temporary_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def _frame_path(directory, digest, name):
+    return os.path.join(directory, f"{digest[:16]}-{name}.parquet")
+
+
+def _partition_keys(dates: pd.Series):
+    return dates.dt.strftime("%Y-%m").fillna(UNDATED_PARTITION)
+
+
+def _in_range(key, date_range):
+    start_date, end_date = date_range
+    if key == UNDATED_PARTITION:
+        return False
+    if start_date is not None and key < f"{pd.Timestamp(start_date):%Y-%m}":
+        return False
+    return end_date is None or key <= f"{pd.Timestamp(end_date):%Y-%m}"
+
+
+def apply_date_range(frame, date_column, date_range):
+    start_date, end_date = date_range
+    mask = pd.Series(True, index=frame.index)
+    if start_date is not None:
+        mask &= frame[date_column] >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= frame[date_column] <= pd.Timestamp(end_date)
+    return frame.loc[mask]
+
+
+def _read_partitioned_frame(directory, manifest, name, date_range):
+    keys = manifest["partitions"][name]
+    if date_range is not None:
+        keys = [key for key in keys if _in_range(key, date_range)]
+    parts = [
+        pd.read_parquet(_frame_path(directory, manifest["hash"], f"{name}-{key}"), memory_map=True)
+        for key in keys
+    ]
+    if not parts:
+        # The undated partition is always written so it doubles as the empty schema
+        return pd.read_parquet(
+            _frame_path(directory, manifest["hash"], f"{name}-{UNDATED_PARTITION}")).iloc[:0]
+    frame = pd.concat(parts)
+    if date_range is None:
+        # Partitions keep the original row labels so the full frame comes back in sheet order
+        return frame.sort_index()
+    return apply_date_range(frame, manifest["partition_columns"][name], date_range)
+
+
+@timing.timed("read parquet cache")
+def _read_frames(workbook_path, manifest, date_range=None, names=None):
+    directory = cache_dir(workbook_path)
+    try:
+        return {
+            name: (
+                _read_partitioned_frame(directory, manifest, name, date_range)
+                if name in manifest["partitions"] else
+                pd.read_parquet(_frame_path(directory, manifest["hash"], name), memory_map=True)
+            )
+            for name in names or manifest["frames"]
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_frames(workbook_path, digest, stat, frames, partition_columns, version):
+    directory = cache_dir(workbook_path)
+    os.makedirs(directory, exist_ok=True)
+    partitions = {}
+    try:
+        for name, frame in frames.items():
+            if name not in partition_columns:
+                frame.to_parquet(_frame_path(directory, digest, name))
+                continue
+            keys = _partition_keys(frame[partition_columns[name]])
+            frame.loc[keys == UNDATED_PARTITION].to_parquet(
+                _frame_path(directory, digest, f"{name}-{UNDATED_PARTITION}"))
+            for key, part in frame.loc[keys != UNDATED_PARTITION].groupby(keys):
+                part.to_parquet(_frame_path(directory, digest, f"{name}-{key}"))
+            partitions[name] = sorted(keys.unique())
+    except (pyarrow.ArrowException, ValueError, TypeError):
+        # Columns pyarrow cannot represent (e.g. mixed types) just mean this version is not cached
+        return
+    previous_manifest = read_manifest(workbook_path)
+    _write_manifest(directory, {
+        "hash": digest,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "frames": list(frames),
+        "partitions": partitions,
+        "partition_columns": partition_columns,
+        "version": version,
+        "date_bounds": {
+            name: [
+                None if pd.isna(bound) else str(bound)
+                for bound in (frames[name][column].min(), frames[name][column].max())
+            ]
+            for name, column in partition_columns.items()
+        },
+    })
+    # The previous version is kept for readers still working through its partitions
+    keep = {digest[:16]} | ({previous_manifest["hash"][:16]} if previous_manifest else set())
+    for filename in os.listdir(directory):
+        if filename.endswith(".parquet") and filename[:16] not in keep:
+            os.remove(os.path.join(directory, filename))
+
+
+def is_current(workbook_path, manifest=None):
+    """Cheap freshness check on the workbook's mtime and size."""
+    manifest = manifest or read_manifest(workbook_path)
+    if manifest is None:
+        return False
+    stat = os.stat(workbook_path)
+    return manifest["mtime_ns"] == stat.st_mtime_ns and manifest["size"] == stat.st_size
+
+
+def _same_layout(manifest, partition_columns, version):
+    return (
+        manifest is not None
+        and manifest.get("partition_columns") == partition_columns
+        and manifest.get("version") == version
+    )
+
+
+def _current_manifest(workbook_path, partition_columns, version):
+    """
+    The manifest when the cache matches the workbook's content, otherwise None.
+
+    A workbook whose mtime moved without its content changing only has its manifest refreshed.
+    """
+    manifest = read_manifest(workbook_path)
+    if not _same_layout(manifest, partition_columns, version):
+        return None
+    if is_current(workbook_path, manifest):
+        return manifest
+    stat = os.stat(workbook_path)
+    if workbook_hash(workbook_path) != manifest["hash"]:
+        return None
+    manifest = {**manifest, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    _write_manifest(cache_dir(workbook_path), manifest)
+    return manifest
+
+
+@timing.timed("rebuild parquet cache")
+def _rebuild(workbook_path, build, partition_columns, version):
+    stat = os.stat(workbook_path)
+    digest = workbook_hash(workbook_path)
+    frames = build(workbook_path)
+    _write_frames(workbook_path, digest, stat, frames, partition_columns, version)
+    return digest, frames
+
+
+def current_hash(workbook_path):
+    """The workbook's content hash, taken from the manifest while it is current."""
+    manifest = read_manifest(workbook_path)
+    if is_current(workbook_path, manifest):
+        return manifest["hash"]
+    return workbook_hash(workbook_path)
+
+
+def load_frames(workbook_path, build, partition_columns=None, date_range=None, names=None, version=1):
+    """
+    Load the frames derived from a workbook, rebuilding them only when the workbook changes.
+
+    `build` is called with the workbook path and returns a dict of named DataFrames. The
+    result is stored as Parquet next to the workbook, keyed by the workbook's mtime and
+    content hash, and memory-mapped on warm loads.
+
+    Frames named in `partition_columns` are stored in one file per month of that date
+    column. When a (start, end) `date_range` is given, either bound may be None, only the
+    months overlapping it are read and the frame is trimmed to the range inclusively.
+    `names` restricts which frames are read back from the cache. Callers bump `version`
+    whenever `build` changes what it produces, which discards existing caches.
+    """
+    return load_versioned_frames(workbook_path, build, partition_columns, date_range, names, version)[1]
+
+
+def load_versioned_frames(workbook_path, build, partition_columns=None, date_range=None, names=None, version=1):
+    """`load_frames`, also returning the content hash of the workbook version they came from."""
+    partition_columns = partition_columns or {}
+    if pyarrow is None:
+        digest = workbook_hash(workbook_path)
+        return digest, _trim_frames(build(workbook_path), partition_columns, date_range)
+
+    manifest = _current_manifest(workbook_path, partition_columns, version)
+    if manifest is not None:
+        frames = _read_frames(workbook_path, manifest, date_range, names)
+        if frames is not None:
+            return manifest["hash"], frames
+
+    with _build_locks[os.path.abspath(workbook_path)]:
+        # Another loader may have rebuilt the cache while this one waited for the lock
+        manifest = _current_manifest(workbook_path, partition_columns, version)
+        if manifest is not None:
+            frames = _read_frames(workbook_path, manifest, date_range, names)
+            if frames is not None:
+                return manifest["hash"], frames
+        digest, frames = _rebuild(workbook_path, build, partition_columns, version)
+    return digest, _trim_frames(frames, partition_columns, date_range)
+
+
+def refresh(workbook_path, build, partition_columns=None, version=1):
+    """Bring the cache up to date with the workbook without reading it back."""
+    partition_columns = partition_columns or {}
+    if pyarrow is None:
+        return
+    with _build_locks[os.path.abspath(workbook_path)]:
+        if _current_manifest(workbook_path, partition_columns, version) is None:
+            _rebuild(workbook_path, build, partition_columns, version)
+
+
+def _trim_frames(frames, partition_columns, date_range):
+    if date_range is None:
+        return frames
+    return {
+        name: apply_date_range(frame, partition_columns[name], date_range)
+        if name in partition_columns else frame
+        for name, frame in frames.items()
+    }
+
+
+def load_date_bounds(workbook_path, build, partition_columns, name, version=1):
+    """The (min, max) of a partitioned frame's date column without reading its partitions."""
+    manifest = read_manifest(workbook_path)
+    if (pyarrow is None
+            or not _same_layout(manifest, partition_columns, version)
+            or not is_current(workbook_path, manifest)):
+        frame = load_frames(workbook_path, build, partition_columns, names=[name], version=version)[name]
+        column = partition_columns[name]
+        return frame[column].min(), frame[column].max()
+    return tuple(None if bound is None else pd.Timestamp(bound) for bound in manifest["date_bounds"][name])
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import timing
+
+try:
+    import python_calamine
+except ImportError:  # pandas falls back to openpyxl, pure Python and several times slower
+    python_calamine = None
+
+
+ENGINE = "calamine" if python_calamine is not None else "openpyxl"
+
+
+def named_columns(column):
+    """Every column with a header, the ones pandas calls "Unnamed: n" have none."""
+    return not str(column).startswith("Unnamed")
+
+
+def only(columns):
+    """Just `columns`, those missing from the sheet are skipped rather than an error."""
+    columns = set(columns)
+    return lambda column: column in columns
+
+
+def read_sheets(workbook_path, sheets, engine=None):
+    """
+    The workbook's `sheets`, {sheet name: the usecols of its columns to read}, as frames.
+
+    Each sheet is parsed in its own thread, so the small lookup sheets are read while the
+    large one still is.
+    """
+    engine = engine or ENGINE
+    parent_span = timing.current()
+
+    def read_sheet(sheet):
+        sheet_name, usecols = sheet
+        with timing.span(f"read_excel {sheet_name}", parent=parent_span, engine=engine) as record:
+            frame = pd.read_excel(workbook_path, sheet_name=sheet_name, usecols=usecols, engine=engine)
+            record["rows"] = len(frame)
+        return frame
+
+    with ThreadPoolExecutor(max_workers=len(sheets), thread_name_prefix="sheets") as pool:
+        return dict(zip(sheets, pool.map(read_sheet, sheets.items())))